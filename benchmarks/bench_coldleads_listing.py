@@ -0,0 +1,97 @@
+"""
+Microbenchmark for listing the coldleads folder at scale.
+
+Generates N lead files in a scratch folder and times the ColdLeadsIndex
+operations behind listcoldleads/showlead/stagefile/searchleads (first index
+build, refresh when nothing changed, count, one page, lookup by number and
+by name substring, a page of full-text search results for a rare and a
+common term) against scanning and parsing every file.
+
+    python benchmarks/bench_coldleads_listing.py --files 1000,10000
+    python benchmarks/bench_coldleads_listing.py --files 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sales_personalized_email.coldleads_index import ColdLeadsIndex, output_filename, read_lead_file  # noqa: E402
+
+SERVICES = ("pest control", "plumbing", "catering", "dental care", "car rental", "interior design", "tutoring")
+
+
+def timed(func, repeat=5):
+    """Median wall time of ``func`` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def scan_folder(folder):
+    """What listing cost before the index: list, then parse every file."""
+    return [read_lead_file(os.path.join(folder, name)) for name in sorted(os.listdir(folder)) if name.endswith(".json")]
+
+
+def bench(files, page_size):
+    workdir = tempfile.mkdtemp(prefix="bench_coldleads_")
+    try:
+        folder = os.path.join(workdir, "coldleads")
+        os.makedirs(folder)
+        for i in range(files):
+            with open(os.path.join(folder, output_filename(f"Benchmark Company {i}")), "w") as f:
+                json.dump(
+                    {
+                        "company": f"Benchmark Company {i}",
+                        "subject_line": "Quick Question",
+                        "email_body": f"I was looking for {SERVICES[i % len(SERVICES)]} businesses like yours"
+                        f" and found your company (lead {i})... " * 5,
+                        "follow_up_notes": "Offer a free demo website." if i % 10 == 0 else "Call in two weeks.",
+                    },
+                    f,
+                )
+
+        index = ColdLeadsIndex(folder, path=os.path.join(workdir, "leads.db"))
+        results = {"index build": timed(lambda: index.refresh(force=True), repeat=1)}
+        results.update(
+            {
+                "full scan + parse": timed(lambda: scan_folder(folder), repeat=3),
+                "refresh (unchanged)": timed(index.refresh),
+                "count": timed(index.count),
+                f"page of {page_size}": timed(lambda: index.list(offset=files // 2, limit=page_size)),
+                "list all": timed(index.list, repeat=3),
+                "by_number": timed(lambda: index.by_number(files // 2)),
+                "find substring": timed(lambda: index.find(f"company_{files // 2}")),
+                "search rare term": timed(lambda: index.search(f"lead {files // 2}", limit=page_size)),
+                "search common term": timed(lambda: index.search("pest control", limit=page_size)),
+                "search field": timed(lambda: index.search("notes:demo", limit=page_size)),
+                "search count": timed(lambda: index.search_count("pest control")),
+            }
+        )
+        return results
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", default="1000,10000", help="comma separated folder sizes")
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    for files in (int(size) for size in args.files.split(",")):
+        print(f"{files} files:")
+        for name, ms in bench(files, args.page_size).items():
+            print(f"  {name:<22} {ms:10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Per-lead crew setup overhead: SalesPersonalizedEmailCrew vs CrewFactory.
+
+Builds (but does not kick off) one crew per lead both ways and reports the
+mean and p95 setup time. No API calls are made; dummy keys are set if none
+are configured.
+
+    python benchmarks/bench_crew_setup.py --leads 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+os.environ.setdefault("SERPER_API_KEY", "bench")
+
+from sales_personalized_email.crew import CrewFactory, SalesPersonalizedEmailCrew  # noqa: E402
+
+
+def measure(build, leads):
+    timings = []
+    for i in range(leads):
+        started = time.perf_counter()
+        build(f"Bench Company {i}").crew()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    p95 = sorted(timings)[int(len(timings) * 0.95) - 1]
+    print(f"{label:<28} mean {statistics.mean(timings):7.2f}ms   p95 {p95:7.2f}ms   total {sum(timings) / 1000:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=100)
+    args = parser.parse_args()
+
+    report("SalesPersonalizedEmailCrew", measure(lambda company: SalesPersonalizedEmailCrew(company_name=company), args.leads))
+
+    started = time.perf_counter()
+    factory = CrewFactory()
+    print(f"{'CrewFactory (one-time setup)':<28} {(time.perf_counter() - started) * 1000:7.2f}ms")
+    report("CrewFactory.build", measure(lambda company: factory.build(company_name=company), args.leads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Throughput benchmark for the commit send pipeline against a local SMTP server.
+
+Needs aiosmtpd (pip install aiosmtpd). Nothing leaves the machine.
+
+    python benchmarks/bench_email_dispatch.py --messages 2000 --pool-size 8
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sales_personalized_email.email_dispatch import EmailDispatcher, OutboundEmail, SMTPConfig  # noqa: E402
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--per-connection", type=int, default=100)
+    parser.add_argument("--domains", type=int, default=20, help="distinct recipient domains")
+    parser.add_argument("--domain-rate", type=int, default=100000, help="messages per minute per domain")
+    args = parser.parse_args()
+
+    if Controller is None:
+        sys.exit("aiosmtpd is required for this benchmark: pip install aiosmtpd")
+
+    handler = CountingHandler()
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        config = SMTPConfig(
+            host="127.0.0.1",
+            port=port,
+            sender="bench@example.com",
+            starttls=False,
+            pool_size=args.pool_size,
+            messages_per_connection=args.per_connection,
+            domain_rate=args.domain_rate,
+        )
+        emails = [
+            OutboundEmail(
+                filename=f"lead_{i}_personalized_email.json",
+                to=f"owner{i}@domain{i % args.domains}.example",
+                subject="Quick Question",
+                body="I was looking for tea shops and found your company...",
+            )
+            for i in range(args.messages)
+        ]
+        result = asyncio.run(EmailDispatcher(config).dispatch(emails))
+    finally:
+        controller.stop()
+
+    print(f"sent:     {len(result.sent)} (server received {handler.received})")
+    print(f"failed:   {len(result.failed)}")
+    print(f"elapsed:  {result.elapsed:.2f}s")
+    print(f"rate:     {result.rate:.1f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
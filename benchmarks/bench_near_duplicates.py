@@ -0,0 +1,125 @@
+"""
+Benchmark for near-duplicate detection over generated emails.
+
+Generates N email bodies in a scratch coldleads folder: most are written
+from a pool of distinct paragraphs, and a share are the same template with
+only the company and a few words changed, which is what the copywriter
+tends to produce. It times the first signature build, a check when nothing
+changed and the LSH pair search, and for smaller N compares the pairs found
+with an exact all-pairs comparison of the same signatures. Pair recall is
+below 1 once a template bucket outgrows MAX_BUCKET (its members are only
+paired with its first member); file recall, the share of duplicated emails
+flagged at all, is what stagefile's gate depends on.
+
+    python benchmarks/bench_near_duplicates.py --emails 1000,10000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sales_personalized_email.coldleads_index import ColdLeadsIndex, output_filename  # noqa: E402
+from sales_personalized_email.near_duplicates import NearDuplicateIndex  # noqa: E402
+
+TEMPLATE = (
+    "Dear {company},\n\nI was looking for {industry} businesses in {city} and found your company. "
+    "Your customers clearly value your work, and a modern website would help more of them find you. "
+    "We build beautiful, brand-aligned websites that load fast and turn visitors into bookings. "
+    "Would you be open to a quick call next week to see a free demo?\n\nBest regards,\nSimplyDebug"
+)
+INDUSTRIES = ("pest control", "plumbing", "catering", "dental care", "car rental", "interior design")
+CITIES = ("Doha", "Dubai", "Riyadh", "Muscat", "Manama")
+
+
+def distinct_body(generator, vocabulary):
+    return " ".join(generator.choice(vocabulary) for _ in range(120))
+
+
+def exact_pairs(matrix, threshold):
+    """All-pairs similarity of the same signatures, for recall."""
+    found = set()
+    for i in range(len(matrix) - 1):
+        similarity = (matrix[i + 1 :] == matrix[i]).mean(axis=1)
+        for j in np.flatnonzero(similarity >= threshold):
+            found.add((i, i + 1 + int(j)))
+    return found
+
+
+def bench(emails, template_share, threshold, seed):
+    generator = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    workdir = tempfile.mkdtemp(prefix="bench_near_duplicates_")
+    try:
+        folder = os.path.join(workdir, "coldleads")
+        os.makedirs(folder)
+        for i in range(emails):
+            company = f"Benchmark Company {i}"
+            if generator.random() < template_share:
+                body = TEMPLATE.format(
+                    company=company, industry=generator.choice(INDUSTRIES), city=generator.choice(CITIES)
+                )
+            else:
+                body = distinct_body(generator, vocabulary)
+            with open(os.path.join(folder, output_filename(company)), "w") as f:
+                json.dump({"company": company, "subject_line": "Quick Question", "email_body": body}, f)
+
+        path = os.path.join(workdir, "leads.db")
+        duplicates = NearDuplicateIndex(ColdLeadsIndex(folder, path=path), path=path, threshold=threshold)
+        started = time.perf_counter()
+        duplicates.refresh()
+        results = {"signature build": (time.perf_counter() - started) * 1000}
+
+        started = time.perf_counter()
+        duplicates.refresh()
+        results["refresh (unchanged)"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        pairs = duplicates.pairs()
+        results["pair search"] = (time.perf_counter() - started) * 1000
+        results["pairs found"] = len(pairs)
+
+        if emails <= 5000:
+            names, matrix = duplicates.signatures()
+            position = {name: i for i, name in enumerate(names)}
+            started = time.perf_counter()
+            expected = exact_pairs(matrix, threshold)
+            results["all-pairs search"] = (time.perf_counter() - started) * 1000
+            found = {tuple(sorted((position[a], position[b]))) for a, b, _ in pairs}
+            results["pair recall"] = len(found & expected) / len(expected) if expected else 1.0
+            expected_files = {i for pair in expected for i in pair}
+            found_files = {i for pair in found for i in pair}
+            results["file recall"] = len(found_files & expected_files) / len(expected_files) if expected_files else 1.0
+        return results
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", default="1000,10000", help="comma separated folder sizes")
+    parser.add_argument("--template-share", type=float, default=0.05, help="fraction of emails written from the template")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for emails in (int(size) for size in args.emails.split(",")):
+        print(f"{emails} emails:")
+        for name, value in bench(emails, args.template_share, args.threshold, args.seed).items():
+            if name == "pairs found":
+                print(f"  {name:<22} {value:10d}")
+            elif name.endswith("recall"):
+                print(f"  {name:<22} {value:10.3f}")
+            else:
+                print(f"  {name:<22} {value:10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
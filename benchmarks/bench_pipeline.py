@@ -0,0 +1,261 @@
+"""
+Offline throughput benchmark for main.run() with a fake LLM and search.
+
+Runs the real pipeline (lead store, CrewFactory crews, CrewAI agents, the
+rate-limited LLM wrapper with its token bucket and 429 retries, the cached
+search tool) in a scratch directory. The Gemini and Serper calls are replaced
+by deterministic local fakes with configurable latency and 429 rate, so
+nothing leaves the machine and no quota is spent.
+
+Each batch size runs in its own process so the memory high-water marks are
+comparable:
+
+    python benchmarks/bench_pipeline.py --leads 10,100,1000 --workers 4
+    python benchmarks/bench_pipeline.py --leads 100 --llm-latency-ms 800 --rate-limit-rate 0.05 --rpm 60
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+# Nothing in a local .env may switch on real keys, caches or shared buckets
+os.environ["GEMINI_API_KEY"] = "offline-benchmark"
+os.environ["GEMINI_API_KEYS"] = ""
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ["RATE_LIMIT_STATE"] = ""
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+SEARCH_TOOL_NAME = "Search the internet with Serper"
+INDUSTRIES = ("Restaurant", "Insurance", "Dental clinic", "Real estate", "Bakery")
+LOCATIONS = ("Doha, Qatar", "Dubai, UAE", "Riyadh, Saudi Arabia")
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class FakeLLM:
+    """
+    Stands in for one API key's LLM client. Answers in CrewAI's ReAct format,
+    searching once before answering when the agent has the search tool.
+    """
+
+    def __init__(self, latency_ms, jitter_ms, rate_limit_rate, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            throttled = self._random.random() < self.rate_limit_rate
+        time.sleep(max(delay, 0) / 1000)
+        if throttled:
+            with self._lock:
+                self.rate_limited += 1
+            raise FakeRateLimitError('429 RESOURCE_EXHAUSTED {"retryDelay": "1s"}')
+
+    def call(self, messages, *args, **kwargs):
+        self._sleep()
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        last = str(messages[-1].get("content", ""))
+
+        if "Personalized Email object" in prompt:
+            answer = json.dumps(
+                {
+                    "subject_line": "Quick Question",
+                    "email_body": "I was looking for businesses like yours and found your company. SimplyDebug",
+                    "follow_up_notes": "Offer a free demo website.",
+                }
+            )
+        elif '"leads" list' in prompt:
+            companies = [line[2:].rsplit(" (", 1)[0] for line in prompt.splitlines() if line.startswith("- ")]
+            answer = json.dumps({"leads": [{"company": company, "achievement": "Award winner"} for company in companies]})
+        elif SEARCH_TOOL_NAME in prompt and "Observation:" not in last:
+            # One distinct query per prompt (so per lead), stable across runs
+            query = f"business reviews {zlib.crc32(prompt.encode()) % 100000}"
+            return (
+                "Thought: I should look this business up.\n"
+                f"Action: {SEARCH_TOOL_NAME}\n"
+                f'Action Input: {{"search_query": "{query}"}}'
+            )
+        else:
+            answer = "1. Award winner 2. No website 3. Online ordering 4. Visibility 5. Web presence"
+        return f"Thought: I now can give a great answer\nFinal Answer: {answer}"
+
+
+class FakeSearch:
+    """Stands in for SerperDevTool."""
+
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def run(self, search_query, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+        return f"Results for '{search_query}': 4.1 stars, customers ask for online booking."
+
+
+def run_batch(args):
+    """One benchmark run in this process; returns the metrics as a dict."""
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.chdir(workdir)
+    os.environ["LEADS_DB"] = os.path.join(workdir, "leads.db")
+
+    from sales_personalized_email.cache import ResponseCache
+    from sales_personalized_email.crew import CrewFactory, RateLimitedLLM
+    from sales_personalized_email.lead_store import LeadStore
+    from sales_personalized_email.main import run
+    from sales_personalized_email.metrics import HistogramSet
+    from sales_personalized_email.rate_limiter import TokenBucket
+    from sales_personalized_email.tools.cached_search_tool import CachedSearchTool
+
+    fake_llm = FakeLLM(args.llm_latency_ms, args.llm_jitter_ms, args.rate_limit_rate, args.seed)
+    fake_search = FakeSearch(args.search_latency_ms)
+    llm = RateLimitedLLM(
+        model="gemini/gemini-2.0-flash",
+        api_key="offline-benchmark",
+        rate_limiter=TokenBucket(max_calls=args.rpm, time_period=60, name="bench"),
+    )
+    for slot in llm._slots:
+        slot.llm = fake_llm
+
+    task_latency = HistogramSet(buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000))
+
+    class TimedCrewFactory(CrewFactory):
+        def build(self, company_name=None, task_callback=None):
+            last = [time.perf_counter()]
+
+            def timed(task_name, output):
+                now = time.perf_counter()
+                task_latency.observe(task_name, (now - last[0]) * 1000)
+                last[0] = now
+                if task_callback is not None:
+                    task_callback(task_name, output)
+
+            return super().build(company_name, timed)
+
+    search_tool = CachedSearchTool(search_tool=fake_search, cache=ResponseCache(path=os.path.join(workdir, "search.db")))
+    factory = TimedCrewFactory(llm=llm, search_tool=search_tool)
+
+    # Leads come in blocks sharing an industry and location, a batch's worth
+    # each, so the batch path runs whatever the lead count
+    block = max(args.batch, 1)
+    store = LeadStore()
+    store.add_many(
+        {
+            "company": f"Benchmark Company {i}",
+            "industry": INDUSTRIES[(i // block) % len(INDUSTRIES)],
+            "business_type": "Small business",
+            "location": LOCATIONS[(i // block) % len(LOCATIONS)],
+        }
+        for i in range(args.leads)
+    )
+
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        summary = run(max_workers=args.workers, batch_size=args.batch, crew_factory=factory)
+    elapsed = time.perf_counter() - started
+    # run() falls back to per-lead research when a batch fails, which would
+    # silently turn a batch benchmark into a per-lead one
+    if args.batch > 1 and args.leads > 1 and not summary["batch_researched"]:
+        raise RuntimeError(f"--batch={args.batch} but no lead was batch-researched")
+
+    limiter = llm.limiter_stats()
+    return {
+        "leads": args.leads,
+        "processed": summary["processed"],
+        "failed": len(summary["failed"]) + len(summary["dead"]),
+        "elapsed_s": round(elapsed, 2),
+        "leads_per_min": round(summary["processed"] / elapsed * 60, 1) if elapsed else 0.0,
+        "llm_calls": fake_llm.calls,
+        "rate_limited": fake_llm.rate_limited,
+        "leads_per_llm_call": summary["leads_per_llm_call"],
+        "batch_researched": summary["batch_researched"],
+        "search_calls": fake_search.calls,
+        "limiter_wait_s": sum(stats["total_wait"] for stats in limiter.values()),
+        "limiter_max_wait_s": max(stats["max_wait"] for stats in limiter.values()),
+        "tasks": task_latency.summaries(),
+        # ru_maxrss is in KB on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def print_report(result):
+    print(
+        f"{result['leads']:>5} leads: {result['processed']} done, {result['failed']} failed in {result['elapsed_s']}s"
+        f" -> {result['leads_per_min']} leads/min, {result['llm_calls']} LLM calls"
+        f" ({result['rate_limited']} 429s, {result['leads_per_llm_call']} leads/call), {result['search_calls']} searches,"
+        f" {result['batch_researched']} batch-researched"
+    )
+    print(
+        f"       limiter wait {result['limiter_wait_s']:.2f}s total / {result['limiter_max_wait_s']:.2f}s max,"
+        f" max RSS {result['max_rss_mb']} MB"
+    )
+    for task, stats in result["tasks"].items():
+        print(f"       {task:<24} p50 {stats['p50_ms']:>8.0f}ms  p95 {stats['p95_ms']:>8.0f}ms  n={stats['count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", default="10,100,1000", help="comma separated batch sizes")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1, help="research batch size (see run --batch)")
+    parser.add_argument("--rpm", type=int, default=6000, help="token bucket size per minute")
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-jitter-ms", type=float, default=10)
+    parser.add_argument("--search-latency-ms", type=float, default=20)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of LLM calls answered with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print one JSON result per run")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.leads.split(",")]
+    if len(sizes) == 1:
+        result = run_batch(argparse.Namespace(**{**vars(args), "leads": sizes[0]}))
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_report(result)
+        return
+
+    # One child process per size, so each reports its own memory high-water
+    options = {key: value for key, value in vars(args).items() if key not in ("leads", "json")}
+    for size in sizes:
+        argv = [f"--{key.replace('_', '-')}={value}" for key, value in options.items()]
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *argv, f"--leads={size}", "--json"],
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            print(f"{size} leads: failed\n{completed.stderr[-2000:]}", file=sys.stderr)
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_report(result)
+
+if __name__ == "__main__":
+    main()
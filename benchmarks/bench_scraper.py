@@ -0,0 +1,134 @@
+"""
+Scraping stage benchmark against local HTTP servers.
+
+Starts --hosts aiohttp servers on 127.0.0.1 (one per port, so each counts as
+its own host) serving HTML pages with a configurable delay and ETags, plus
+an oversized page, a page slower than the timeout and a non-HTML file. It
+then scrapes every page twice with PageScraper: once cold, and once warm,
+where pages are revalidated with If-None-Match and answered 304.
+
+    python benchmarks/bench_scraper.py --hosts 4 --pages 25 --delay-ms 200
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sales_personalized_email.cache import ResponseCache  # noqa: E402
+from sales_personalized_email.scraper import PageScraper, ScrapeConfig  # noqa: E402
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+PAGE = """<html><head><title>Company {n}</title><style>body {{ color: red }}</style>
+<script>var tracking = 1;</script></head><body><h1>Company {n}</h1>
+<p>Family-run business since 1998. Book online &amp; get 10% off.</p>
+<ul><li>Review: great service</li><li>Review: slow website, hard to book</li></ul></body></html>"""
+
+
+class Counters:
+    def __init__(self):
+        self.requests = 0
+        self.not_modified = 0
+
+
+def make_app(counters, delay, timeout):
+    async def page(request):
+        counters.requests += 1
+        n = request.match_info["n"]
+        body = PAGE.format(n=n)
+        etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            counters.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        await asyncio.sleep(delay)
+        return web.Response(text=body, content_type="text/html", headers={"ETag": etag})
+
+    async def huge(request):
+        counters.requests += 1
+        return web.Response(text="<p>" + "x" * 5_000_000 + "</p>", content_type="text/html")
+
+    async def slow(request):
+        counters.requests += 1
+        await asyncio.sleep(timeout * 2)
+        return web.Response(text="<p>too late</p>", content_type="text/html")
+
+    async def binary(request):
+        counters.requests += 1
+        return web.Response(body=b"%PDF-1.4", content_type="application/pdf")
+
+    app = web.Application()
+    app.add_routes([
+        web.get("/page/{n}", page),
+        web.get("/huge", huge),
+        web.get("/slow", slow),
+        web.get("/file.pdf", binary),
+    ])
+    return app
+
+
+async def bench(args):
+    counters = Counters()
+    runners, ports = [], []
+    for _ in range(args.hosts):
+        runner = web.AppRunner(make_app(counters, args.delay_ms / 1000, args.timeout))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        ports.append(site._server.sockets[0].getsockname()[1])
+
+    urls = [f"http://127.0.0.1:{port}/page/{i}" for port in ports for i in range(args.pages)]
+    urls += [f"http://127.0.0.1:{ports[0]}/{path}" for path in ("huge", "slow", "file.pdf")]
+
+    config = ScrapeConfig(
+        concurrency=args.concurrency, per_host=args.per_host, timeout=args.timeout, max_bytes=args.max_bytes
+    )
+    scraper = PageScraper(config, cache=ResponseCache(path=os.path.join(tempfile.mkdtemp(), "scrape.db")))
+    try:
+        for label in ("cold", "warm"):
+            counters.requests = counters.not_modified = 0
+            started = time.perf_counter()
+            pages = await scraper.scrape(urls)
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for text in pages.values() if text)
+            print(
+                f"{label}: {ok}/{len(urls)} pages in {elapsed:.2f}s ({len(urls) / elapsed:.1f} pages/s), "
+                f"{counters.requests} requests, {counters.not_modified} answered 304"
+            )
+        sample = pages[urls[0]]
+        print(f"extracted sample ({len(sample)} chars):\n{sample}")
+        huge = pages.get(urls[-3])
+        print(f"oversized page kept {len(huge or '')} chars")
+        serial = len(urls) * args.delay_ms / 1000
+        print(f"one page at a time would take at least {serial:.1f}s")
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=25, help="pages per host")
+    parser.add_argument("--delay-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--per-host", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--max-bytes", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if web is None:
+        sys.exit("aiohttp is required for this benchmark: pip install aiohttp")
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
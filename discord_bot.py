@@ -6,11 +6,22 @@ from typing import Dict, List, Any
 import re
 import subprocess
 import datetime
+import time
 from dotenv import load_dotenv
 import sys
 import io
+import tempfile
 import threading
-from src.sales_personalized_email.main import run
+from src.sales_personalized_email.lead_store import DEAD, FAILED, REQUIRED_FIELDS, RESUMABLE, LeadStore
+from src.sales_personalized_email.lead_import import import_leads
+from src.sales_personalized_email.coldleads_index import ColdLeadsIndex
+from src.sales_personalized_email.email_dispatch import DispatchResult, EmailDispatcher, load_outbound_email
+from src.sales_personalized_email.job_scheduler import ACTIVE, JobScheduler
+from src.sales_personalized_email.near_duplicates import NearDuplicateIndex
+from src.sales_personalized_email.metrics import TRACER, HistogramSet, export_metrics
+from src.sales_personalized_email.pagination import CHUNK_LIMIT, MESSAGE_LIMIT, Paginator, chunk_text, parse_page, send_paginated
+from src.sales_personalized_email.staging_area import StagingArea
+from src.sales_personalized_email.storage import read_json_async, run_blocking, update_json_async
 import asyncio
 
 sys.stdout = io.TextIOWrapper(sys.stdout.detach(), encoding='utf-8')
@@ -27,46 +38,118 @@ intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix=PREFIX, intents=intents)
 
-# Path to JSON file for storing business data (legacy)
-JSON_FILE = 'businesses.json'
+# Lead repository (SQLite). Leads from the legacy businesses.json are imported on first use
+LEAD_STORE = LeadStore()
 
 # Path to folder for storing individual business JSON files
 COLDLEADS_FOLDER = 'coldleads'
 
-# Global variable to track staged files
-STAGED_FILES = set()
+# Manifest of the coldleads folder, so commands don't rescan and parse every file
+COLDLEADS_INDEX = ColdLeadsIndex(COLDLEADS_FOLDER)
 
-# Initialize JSON file if it doesn't exist
+# Similarity of the generated emails, checked by dedupcheck and before staging
+NEAR_DUPLICATES = NearDuplicateIndex(COLDLEADS_INDEX)
+
+# Durable staging area, shared by every bot instance using the same lead database
+STAGING_AREA = StagingArea(COLDLEADS_INDEX, duplicates=NEAR_DUPLICATES)
+
+# Command handling time, per command
+COMMAND_LATENCY = HistogramSet()
+
+# Background crew batches; bounded so repeated commands can't pile up threads
+JOB_SCHEDULER = JobScheduler(max_workers=int(os.getenv('CREW_JOB_WORKERS', '1')))
+
+# The crew stack (crewai, crewai_tools, litellm, the Gemini client) takes seconds to
+# import, so it is loaded on first use or in the background once the bot is connected
+_crew_run = None
+_crew_import_lock = threading.Lock()
+
+def load_crew_run():
+    """Import the crew entry point on first use; blocking, call it off the event loop."""
+    global _crew_run
+    with _crew_import_lock:
+        if _crew_run is None:
+            started = time.perf_counter()
+            from src.sales_personalized_email.main import run
+            _crew_run = run
+            print(f"Loaded the email crew in {time.perf_counter() - started:.1f}s")
+    return _crew_run
+
+async def preload_crew():
+    try:
+        await run_blocking(load_crew_run)
+    except Exception as e:
+        # runemailcrew will retry the import and report the error
+        print(f"Background crew preload failed: {e}")
+
+# Create coldleads folder if it doesn't exist
 def initialize_json_file():
-    if not os.path.exists(JSON_FILE):
-        with open(JSON_FILE, 'w') as f:
-            json.dump([], f)
-    
-    # Also create coldleads folder if it doesn't exist
     if not os.path.exists(COLDLEADS_FOLDER):
         os.makedirs(COLDLEADS_FOLDER)
 
-# Add business data to coldleads folder as individual JSON file
-async def add_business(business_data: Dict[str, Any]):    
-    try:
-        with open(JSON_FILE, 'r') as f:
-            businesses = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        businesses = []
-    
-    businesses.append(business_data)
-    
-    with open(JSON_FILE, 'w') as f:
-        json.dump(businesses, f, indent=4)
-    
-    # Count the total number of files in the coldleads folder
-    json_files = [f for f in os.listdir(COLDLEADS_FOLDER) if f.endswith('.json')]
-    return len(json_files)
+# Add business data to the lead store as a pending lead
+async def add_business(business_data: Dict[str, Any]):
+    return await run_blocking(LEAD_STORE.add, business_data)
 
 @bot.event
 async def on_ready():
     print(f'{bot.user} has connected to Discord!')
-    initialize_json_file()
+    await run_blocking(initialize_json_file)
+    if os.getenv('CREW_PRELOAD', 'true').lower() in ('1', 'true', 'yes'):
+        asyncio.create_task(preload_crew())
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    started_at = getattr(ctx, 'started_at', None)
+    if started_at is not None:
+        COMMAND_LATENCY.observe(ctx.command.name, (time.perf_counter() - started_at) * 1000)
+
+@bot.command(name='latency')
+async def show_latency(ctx):
+    """Shows how long each command has taken to handle (p50/p95/p99 in ms)."""
+    summaries = COMMAND_LATENCY.summaries()
+    if not summaries:
+        await ctx.send("No commands timed yet.")
+        return
+    
+    response = "**Command latency (ms):**\n```\n"
+    for name, summary in summaries.items():
+        response += (f"{name}: n={summary['count']} avg={summary['avg_ms']} p50={summary['p50_ms']} "
+                     f"p95={summary['p95_ms']} p99={summary['p99_ms']} max={summary['max_ms']}\n")
+    response += "```"
+    await ctx.send(response)
+
+@bot.command(name='stats')
+async def show_stats(ctx):
+    """
+    Shows where email automation time goes: crew kickoffs, tasks, tool calls and LLM calls,
+    with p50/p95 duration, tokens in/out and time spent waiting on the rate limiter.
+    """
+    summaries = TRACER.summaries()
+    if not summaries:
+        await ctx.send("No crew activity recorded yet. Run `DuDe runemailcrew` first.")
+        return
+    
+    response = "**Email automation stats:**\n```\n"
+    for name, summary in summaries.items():
+        response += f"{name}: n={summary['count']} p50={summary['p50_ms']:.0f}ms p95={summary['p95_ms']:.0f}ms"
+        if 'tokens_in' in summary:
+            response += f" tokens={summary['tokens_in']}/{summary.get('tokens_out', 0)}"
+        if summary.get('wait_s'):
+            response += f" wait={summary['wait_s']:.1f}s"
+        if summary.get('cache_hits'):
+            response += f" cached={summary['cache_hits']}"
+        if summary.get('errors'):
+            response += f" errors={summary['errors']}"
+        response += "\n"
+    response += "```"
+    await ctx.send(response)
+    # Refresh the dashboard textfile too
+    await run_blocking(export_metrics)
 
 @bot.command(name='addlead')
 async def add_business_command(ctx, *, data):
@@ -84,8 +167,7 @@ async def add_business_command(ctx, *, data):
             business_data[key] = value
         
         # Check for required fields
-        required_fields = ['company', 'industry', 'business_type', 'location']
-        missing_fields = [field for field in required_fields if field not in business_data]
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in business_data]
         
         if missing_fields:
             missing_str = ", ".join(missing_fields)
@@ -101,60 +183,101 @@ async def add_business_command(ctx, *, data):
     except Exception as e:
         await ctx.send(f"Error adding business: {str(e)}\nUsage: DuDe addlead company=\"Company Name\" industry=\"Industry\" business_type=\"Business Type\" location=\"Location\"")
 
+@bot.command(name='importleads')
+async def import_leads_command(ctx):
+    """
+    Imports leads in bulk from an attached CSV or JSONL file.
+    Each row needs company, industry, business_type and location; companies already in the store are skipped.
+    Usage: DuDe importleads (with the file attached to the message)
+    """
+    if not ctx.message.attachments:
+        await ctx.send("Please attach a .csv or .jsonl file with columns company, industry, business_type, location.")
+        return
+    
+    attachment = ctx.message.attachments[0]
+    extension = os.path.splitext(attachment.filename)[1].lower()
+    if extension not in ('.csv', '.jsonl', '.ndjson'):
+        await ctx.send(f"Unsupported file '{attachment.filename}'. Please attach a .csv or .jsonl file.")
+        return
+    
+    # Stream the attachment to disk, then parse it row by row off the event loop
+    fd, path = tempfile.mkstemp(suffix=extension)
+    os.close(fd)
+    try:
+        await attachment.save(path)
+        report = await run_blocking(import_leads, LEAD_STORE, path)
+    except Exception as e:
+        await ctx.send(f"Error importing leads: {str(e)}")
+        return
+    finally:
+        os.unlink(path)
+    
+    response = (f"Imported {report.imported} of {report.rows} row(s) from '{attachment.filename}' "
+                f"in {report.elapsed:.2f}s ({report.rate:.0f} rows/sec).")
+    if report.duplicates:
+        response += f"\nSkipped {len(report.duplicates)} duplicate lead(s): {', '.join(report.duplicates[:20])}"
+        if len(report.duplicates) > 20:
+            response += ", ..."
+    if report.rejected:
+        response += f"\nRejected {len(report.rejected)} row(s):\n"
+        response += "\n".join(f"row {number}: {reason}" for number, reason in report.rejected[:20])
+        if len(report.rejected) > 20:
+            response += "\n..."
+    await ctx.send(response)
+
 @bot.command(name='listrawleads')
-async def list_raw_businesses(ctx):
-    """Lists all businesses in the legacy database file."""
+async def list_raw_businesses(ctx, page: str = None):
+    """
+    Lists all leads in the lead store that haven't been processed yet, one page at a time.
+    Usage: DuDe listrawleads or DuDe listrawleads page=3
+    """
     try:
-        with open(JSON_FILE, 'r') as f:
-            businesses = json.load(f)
+        total = await run_blocking(LEAD_STORE.count, statuses=RESUMABLE)
         
-        if not businesses:
+        if not total:
             await ctx.send("No leads found in the database.")
             return
         
-        response = f"Total leads: {len(businesses)}\n\n"
-        for i, business in enumerate(businesses, 1):
-            response += f"{i}. {business['company']} - {business['industry']} ({business['location']})\n"
-            
-        await ctx.send(response)
+        paginator = Paginator(
+            title="Leads waiting to be processed",
+            total=total,
+            fetch=lambda offset, limit: LEAD_STORE.list(statuses=RESUMABLE, offset=offset, limit=limit),
+            format_item=lambda i, business: f"{i}. {business['company']} - {business['industry']} ({business['location']}) [{business['status']}]",
+            header=f"Total leads: {total}",
+        )
+        await send_paginated(ctx, paginator, parse_page(page))
     except Exception as e:
         await ctx.send(f"Error loading businesses: {str(e)}")
 
 @bot.command(name='listcoldleads')
-async def list_cold_leads(ctx):
-    """Lists all JSON files in the coldleads folder."""
+async def list_cold_leads(ctx, page: str = None):
+    """
+    Lists all JSON files in the coldleads folder, one page at a time.
+    Usage: DuDe listcoldleads or DuDe listcoldleads page=3
+    """
     try:
         # Create coldleads folder if it doesn't exist
-        if not os.path.exists(COLDLEADS_FOLDER):
-            os.makedirs(COLDLEADS_FOLDER)
+        if not await run_blocking(os.path.exists, COLDLEADS_FOLDER):
+            await run_blocking(os.makedirs, COLDLEADS_FOLDER)
             await ctx.send(f"Created '{COLDLEADS_FOLDER}' folder. No JSON files found yet.")
             return
         
-        # Get all JSON files in the folder
-        json_files = [f for f in os.listdir(COLDLEADS_FOLDER) if f.endswith('.json')]
+        # Count the JSON files in the folder from the manifest
+        total = await run_blocking(COLDLEADS_INDEX.count)
         
-        if not json_files:
+        if not total:
             await ctx.send(f"No JSON files found in the '{COLDLEADS_FOLDER}' folder.")
             return
         
-        # List all JSON files
-        response = f"Found {len(json_files)} JSON file(s) in '{COLDLEADS_FOLDER}' folder:\n\n"
-        for i, file in enumerate(json_files, 1):
-            # Try to read company information from each file
-            file_path = os.path.join(COLDLEADS_FOLDER, file)
-            try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                    if isinstance(data, list) and len(data) > 0 and 'company' in data[0]:
-                        company_name = data[0]['company']
-                        response += f"{i}. {file} - Contains data for {company_name}\n"
-                    else:
-                        response += f"{i}. {file}\n"
-            except Exception:
-                # If can't read or parse file, just list the filename
-                response += f"{i}. {file}\n"
-            
-        await ctx.send(response)
+        # Each page reads only its own slice of the manifest
+        paginator = Paginator(
+            title=f"Cold leads in '{COLDLEADS_FOLDER}'",
+            total=total,
+            fetch=lambda offset, limit: COLDLEADS_INDEX.list(offset=offset, limit=limit),
+            format_item=lambda i, entry: f"{entry['number']}. {entry['filename']} - Contains data for {entry['company']}",
+            header=f"Found {total} JSON file(s)",
+        )
+        await send_paginated(ctx, paginator, parse_page(page))
     except Exception as e:
         await ctx.send(f"Error listing JSON files: {str(e)}")
 
@@ -163,20 +286,19 @@ async def show_lead(ctx, file_number: int = None, file_name: str = None):
     """
     Displays the contents of a specific JSON file from the coldleads folder.
     Usage: 
-    - DuDe showlead 3 (displays the 3rd file from the listcoldleads command)
+    - DuDe showlead 3 (displays the file numbered 3 by the listcoldleads command)
     - DuDe showlead filename="company_name_20240620_123045.json" (displays the file with the exact name)
     """
     try:
         # Create coldleads folder if it doesn't exist
-        if not os.path.exists(COLDLEADS_FOLDER):
-            os.makedirs(COLDLEADS_FOLDER)
+        if not await run_blocking(os.path.exists, COLDLEADS_FOLDER):
+            await run_blocking(os.makedirs, COLDLEADS_FOLDER)
             await ctx.send(f"Created '{COLDLEADS_FOLDER}' folder. No JSON files found yet.")
             return
         
-        # Get all JSON files in the folder
-        json_files = [f for f in os.listdir(COLDLEADS_FOLDER) if f.endswith('.json')]
+        file_count = await run_blocking(COLDLEADS_INDEX.count)
         
-        if not json_files:
+        if not file_count:
             await ctx.send(f"No JSON files found in the '{COLDLEADS_FOLDER}' folder.")
             return
         
@@ -190,25 +312,23 @@ async def show_lead(ctx, file_number: int = None, file_name: str = None):
             if match:
                 file_name = match.group(1)
                 
-            if file_name in json_files:
-                target_file = file_name
+            # Exact match comes first, then partial matches
+            matching_files = await run_blocking(COLDLEADS_INDEX.find, file_name)
+            if matching_files:
+                target_file = matching_files[0]
+                if target_file != file_name and len(matching_files) > 1:
+                    await ctx.send(f"Multiple files match '{file_name}'. Showing the first match: {target_file}")
             else:
-                # Try partial match if exact match not found
-                matching_files = [f for f in json_files if file_name.lower() in f.lower()]
-                if matching_files:
-                    target_file = matching_files[0]
-                    if len(matching_files) > 1:
-                        await ctx.send(f"Multiple files match '{file_name}'. Showing the first match: {target_file}")
-                else:
-                    await ctx.send(f"No file found matching '{file_name}' in the '{COLDLEADS_FOLDER}' folder.")
-                    return
+                await ctx.send(f"No file found matching '{file_name}' in the '{COLDLEADS_FOLDER}' folder.")
+                return
         
         # If file_number is provided (index in the list)
         elif file_number is not None:
-            if 1 <= file_number <= len(json_files):
-                target_file = json_files[file_number - 1]
+            entry = await run_blocking(COLDLEADS_INDEX.by_number, file_number)
+            if entry:
+                target_file = entry['filename']
             else:
-                await ctx.send(f"Invalid file number. Please use a number between 1 and {len(json_files)}.")
+                await ctx.send(f"No file numbered {file_number}. Use `DuDe listcoldleads` to see the file numbers.")
                 return
         
         # If neither is provided
@@ -219,43 +339,128 @@ async def show_lead(ctx, file_number: int = None, file_name: str = None):
         # Read and display the file contents
         file_path = os.path.join(COLDLEADS_FOLDER, target_file)
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                # Format the JSON data for better display
-                formatted_data = json.dumps(data, indent=2)
-                
-                # Check if the formatted data is too long for Discord's message limit
-                if len(formatted_data) > 1900:  # Discord's limit is 2000, keeping some margin
-                    # Truncate and show important fields
-                    response = f"**File: {target_file}** (Showing summary due to large size)\n\n"
-                    if isinstance(data, list) and len(data) > 0:
-                        lead = data[0]
-                        response += "```json\n"
-                        for key, value in lead.items():
-                            response += f"{key}: {value}\n"
-                        response += "```"
-                    else:
-                        response += "```json\n" + formatted_data[:1800] + "\n... (truncated) ```"
-                else:
-                    response = f"**File: {target_file}**\n\n```json\n{formatted_data}\n```"
-                
-                await ctx.send(response)
+            data = await read_json_async(file_path)
+            # Format the JSON data for better display
+            formatted_data = json.dumps(data, indent=2)
+            
+            # Large files are split into pages instead of being truncated;
+            # each page is one whole chunk, sized so it fits with its code fence
+            fence = "```json\n{}\n```"
+            chunks = list(chunk_text(formatted_data, limit=CHUNK_LIMIT - len(fence.format(""))))
+            paginator = Paginator(
+                title=f"File: {target_file}",
+                total=len(chunks),
+                fetch=lambda offset, limit: chunks[offset:offset + limit],
+                format_item=lambda i, chunk: fence.format(chunk),
+                page_size=1,
+                max_line=None,
+            )
+            await send_paginated(ctx, paginator)
         except Exception as e:
             await ctx.send(f"Error reading file '{target_file}': {str(e)}")
     
     except Exception as e:
         await ctx.send(f"Error displaying lead: {str(e)}")
 
+@bot.command(name='searchleads')
+async def search_leads(ctx, *, query: str = None):
+    """
+    Full-text search over the generated emails and their leads' details, best match first.
+    Usage:
+    - DuDe searchleads pest control (files mentioning both words)
+    - DuDe searchleads "pest control" notes:demo page=2 (a phrase, and "demo" in the follow-up notes)
+    """
+    if not query:
+        await ctx.send('Usage: `DuDe searchleads <words or "phrase">` (prefix a word with subject:, body:, notes:, company:, industry:, type: or location: to search one field)')
+        return
+
+    page = 1
+    match = re.search(r'\s*\bpage=(\d+)\s*$', query)
+    if match:
+        page = parse_page(match.group(0).strip())
+        query = query[:match.start()]
+
+    try:
+        total = await run_blocking(COLDLEADS_INDEX.search_count, query)
+
+        if not total:
+            await ctx.send(f"No generated emails match '{query}'.")
+            return
+
+        paginator = Paginator(
+            title=f"Search: {query}"[:256],
+            total=total,
+            fetch=lambda offset, limit: COLDLEADS_INDEX.search(query, offset=offset, limit=limit),
+            format_item=lambda i, hit: f"{i}. {hit['filename']} - {hit['subject_line'] or hit['company']}: {hit['snippet']}",
+            page_size=10,
+            header=f"{total} matching file(s). Open one with `DuDe showlead filename=\"...\"`",
+        )
+        await send_paginated(ctx, paginator, page)
+    except (ValueError, RuntimeError) as e:
+        await ctx.send(str(e))
+    except Exception as e:
+        await ctx.send(f"Error searching leads: {str(e)}")
+
+@bot.command(name='listfailedleads')
+async def list_failed_leads(ctx, page: str = None):
+    """
+    Lists leads whose crew run failed, including the dead-letter list.
+    Usage: DuDe listfailedleads or DuDe listfailedleads page=2
+    """
+    try:
+        total = await run_blocking(LEAD_STORE.count, statuses=[FAILED, DEAD])
+        
+        if not total:
+            await ctx.send("No failed leads.")
+            return
+        
+        paginator = Paginator(
+            title="Failed leads",
+            total=total,
+            fetch=lambda offset, limit: LEAD_STORE.list(statuses=[FAILED, DEAD], offset=offset, limit=limit),
+            format_item=lambda i, lead: f"#{lead['id']} {lead['company']} [{lead['status']}, {lead['attempts']} attempt(s)]: {lead.get('last_error') or ''}",
+            page_size=10,
+            header=f"Failed leads: {total}",
+        )
+        await send_paginated(ctx, paginator, parse_page(page))
+    except Exception as e:
+        await ctx.send(f"Error loading failed leads: {str(e)}")
+
+@bot.command(name='retrylead')
+async def retry_lead(ctx, lead_id: str = None):
+    """
+    Moves failed or dead leads back to pending.
+    Usage: DuDe retrylead 12 (one lead) or DuDe retrylead all
+    """
+    if lead_id is None:
+        await ctx.send("Usage: DuDe retrylead <lead id> or DuDe retrylead all")
+        return
+    try:
+        count = await run_blocking(LEAD_STORE.requeue, None if lead_id == 'all' else int(lead_id))
+        await ctx.send(f"Requeued {count} lead(s). Run `DuDe runemailcrew` to process them.")
+    except ValueError:
+        await ctx.send("Usage: DuDe retrylead <lead id> or DuDe retrylead all")
+
 @bot.command(name='help_leads')
 async def help_business(ctx):
     """Shows help information for business commands."""
     help_text = """
 **Business Bot Commands:**
 `DuDe addlead company="Company Name" industry="Industry" business_type="Business Type" location="Location"` - Add a new business lead
-`DuDe listcoldleads` - List all JSON files in the coldleads folder
-`DuDe showlead 3` - Display contents of the 3rd file from the listcoldleads command
+`DuDe listcoldleads` - List all JSON files in the coldleads folder (`page=2` for the next page)
+`DuDe showlead 3` - Display contents of the file numbered 3 by the listcoldleads command
 `DuDe showlead filename="company_name_20240620_123045.json"` - Display contents of a specific file
-`DuDe listrawleads` - List all businesses in the legacy database file
+`DuDe searchleads pest control` - Search the generated emails and lead details (`notes:demo` for one field, `page=2` for more)
+`DuDe dedupcheck` - List generated emails that are nearly identical (optional threshold, e.g. `0.7`)
+`DuDe importleads` - Import leads from an attached .csv/.jsonl file
+`DuDe listrawleads` - List all leads waiting to be processed (`page=2` for the next page)
+`DuDe latency` - Show command handling time percentiles
+`DuDe stats` - Show time, tokens and rate-limit waits per crew, task, tool and LLM call
+`DuDe runemailcrew` - Process pending leads in the background (`force` to regenerate existing emails)
+`DuDe jobstatus` - Show progress, leads/min and ETA of email automation jobs (`page=2` for older jobs)
+`DuDe canceljob 3` - Cancel an email automation job
+`DuDe listfailedleads` - List leads whose crew run failed (`page=2` for the next page)
+`DuDe retrylead 12` - Requeue a failed lead (or `all`)
 `DuDe help_leads` - Show this help message
 
 **Examples:**
@@ -272,55 +477,88 @@ async def stage_files(ctx, *files):
     Usage: 
     - DuDe stagefile . (stages all files)
     - DuDe stagefile file1.json file2.json (stages specific files)
+    - DuDe stagefile . force (also stages files that nearly duplicate another staged email)
     """
-    global STAGED_FILES
-    
+    allow_duplicates = 'force' in files
+    files = tuple(file for file in files if file != 'force')
+
     # Create coldleads folder if it doesn't exist
-    if not os.path.exists(COLDLEADS_FOLDER):
-        os.makedirs(COLDLEADS_FOLDER)
+    if not await run_blocking(os.path.exists, COLDLEADS_FOLDER):
+        await run_blocking(os.makedirs, COLDLEADS_FOLDER)
         await ctx.send(f"Created '{COLDLEADS_FOLDER}' folder. No JSON files found yet.")
         return
     
-    # Get all JSON files in the folder
-    json_files = [f for f in os.listdir(COLDLEADS_FOLDER) if f.endswith('.json')]
+    file_count = await run_blocking(COLDLEADS_INDEX.count)
     
-    if not json_files:
+    if not file_count:
         await ctx.send(f"No JSON files found in the '{COLDLEADS_FOLDER}' folder.")
         return
     
     # If "." is provided, stage all files
     if len(files) == 1 and files[0] == '.':
-        before_count = len(STAGED_FILES)
-        STAGED_FILES.update(json_files)
-        new_count = len(STAGED_FILES) - before_count
-        await ctx.send(f"Staged all {len(json_files)} files. {new_count} new files added to staging area.")
+        new_count, held = await run_blocking(STAGING_AREA.stage_all, allow_duplicates)
+        await ctx.send(f"Staged all {file_count - len(held)} files. {new_count} new files added to staging area.")
+        if held:
+            await ctx.send(format_held_back(held))
         return
     
-    # Stage specific files
-    staged_count = 0
-    not_found = []
+    # Stage specific files (exact names or partial matches)
+    matches, not_found, held = await run_blocking(STAGING_AREA.stage, files, allow_duplicates)
+    staged_count = sum(len(found) for found in matches.values())
     
-    for file in files:
-        # If exact match
-        if file in json_files:
-            STAGED_FILES.add(file)
-            staged_count += 1
-        else:
-            # Try partial match
-            matches = [f for f in json_files if file.lower() in f.lower()]
-            if matches:
-                STAGED_FILES.update(matches)
-                staged_count += len(matches)
-                if len(matches) > 1:
-                    await ctx.send(f"Multiple files match '{file}'. Added {len(matches)} files to staging area.")
-            else:
-                not_found.append(file)
+    for file, found in matches.items():
+        if len(found) > 1:
+            await ctx.send(f"Multiple files match '{file}'. Added {len(found)} files to staging area.")
     
     response = f"Staged {staged_count} file(s)."
     if not_found:
         response += f" Could not find these files: {', '.join(not_found)}"
     
     await ctx.send(response)
+    if held:
+        await ctx.send(format_held_back(held))
+
+def format_held_back(held):
+    """Message listing files stagefile kept out as near-duplicates."""
+    lines = [f"{filename} ({similarity:.0%} like {twin})" for filename, (twin, similarity) in list(held.items())[:20]]
+    if len(held) > 20:
+        lines.append("...")
+    return (f"Held back {len(held)} near-duplicate email(s), rewrite them or stage with `force`:\n"
+            + "\n".join(lines))[:2000]
+
+@bot.command(name='dedupcheck')
+async def dedup_check(ctx, threshold: str = None, page: str = None):
+    """
+    Lists pairs of generated emails with nearly the same body, most similar first.
+    Usage: DuDe dedupcheck, DuDe dedupcheck 0.7 (similarity threshold) or DuDe dedupcheck 0.7 page=2
+    """
+    if threshold and threshold.startswith('page='):
+        threshold, page = None, threshold
+    try:
+        threshold = float(threshold) if threshold else NEAR_DUPLICATES.threshold
+        if not 0 < threshold <= 1:
+            raise ValueError
+    except ValueError:
+        await ctx.send("Usage: DuDe dedupcheck [threshold between 0 and 1] [page=N]")
+        return
+
+    try:
+        pairs = await run_blocking(NEAR_DUPLICATES.pairs, threshold=threshold)
+
+        if not pairs:
+            await ctx.send(f"No emails are {threshold:.0%} or more alike.")
+            return
+
+        paginator = Paginator(
+            title=f"Near-duplicate emails (≥ {threshold:.0%} alike)",
+            total=len(pairs),
+            fetch=lambda offset, limit: pairs[offset:offset + limit],
+            format_item=lambda i, pair: f"{i}. {pair[0]} ~ {pair[1]} ({pair[2]:.0%})",
+            header=f"{len(pairs)} pair(s). `stagefile` holds back the second email of a pair unless run with `force`.",
+        )
+        await send_paginated(ctx, paginator, parse_page(page))
+    except Exception as e:
+        await ctx.send(f"Error checking for near-duplicates: {str(e)}")
 
 @bot.command(name='add_gmail')
 async def add_gmail(ctx, filename: str = None, gmail: str = None):
@@ -334,17 +572,18 @@ async def add_gmail(ctx, filename: str = None, gmail: str = None):
 
     file_path = os.path.join(COLDLEADS_FOLDER, filename)
 
-    if not os.path.exists(file_path):
+    if not await run_blocking(os.path.exists, file_path):
         await ctx.send(f"Error: File '{filename}' not found in '{COLDLEADS_FOLDER}'.")
         return
 
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+    def set_email(data):
         data["email"] = gmail
+        return data
 
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4)
+    try:
+        # Read-modify-write under the file's lock, so it can't interleave with a crew write
+        await update_json_async(file_path, set_email)
+        await run_blocking(COLDLEADS_INDEX.update_file, filename)
 
         await ctx.send(f"Successfully added Gmail '{gmail}' to '{filename}'.")
     except Exception as e:
@@ -358,39 +597,23 @@ async def unstage_files(ctx, *files):
     - DuDe unstagefile . (unstages all files)
     - DuDe unstagefile file1.json file2.json (unstages specific files)
     """
-    global STAGED_FILES
-    
-    if not STAGED_FILES:
+    if not await run_blocking(STAGING_AREA.count):
         await ctx.send("No files are currently staged.")
         return
     
     # If "." is provided, unstage all files
     if len(files) == 1 and files[0] == '.':
-        count = len(STAGED_FILES)
-        STAGED_FILES.clear()
+        count = await run_blocking(STAGING_AREA.unstage_all)
         await ctx.send(f"Unstaged all {count} files. Staging area is now empty.")
         return
     
-    # Unstage specific files
-    unstaged_count = 0
-    not_found = []
+    # Unstage specific files (exact names or partial matches)
+    matches, not_found = await run_blocking(STAGING_AREA.unstage, files)
+    unstaged_count = sum(len(found) for found in matches.values())
     
-    for file in files:
-        # If exact match
-        if file in STAGED_FILES:
-            STAGED_FILES.remove(file)
-            unstaged_count += 1
-        else:
-            # Try partial match
-            matches = [f for f in STAGED_FILES if file.lower() in f.lower()]
-            if matches:
-                for match in matches:
-                    STAGED_FILES.remove(match)
-                unstaged_count += len(matches)
-                if len(matches) > 1:
-                    await ctx.send(f"Multiple files match '{file}'. Removed {len(matches)} files from staging area.")
-            else:
-                not_found.append(file)
+    for file, found in matches.items():
+        if len(found) > 1:
+            await ctx.send(f"Multiple files match '{file}'. Removed {len(found)} files from staging area.")
     
     response = f"Unstaged {unstaged_count} file(s)."
     if not_found:
@@ -399,32 +622,38 @@ async def unstage_files(ctx, *files):
     await ctx.send(response)
 
 @bot.command(name='liststaged')
-async def list_staged_files(ctx):
-    """Lists all files currently in the staging area."""
-    global STAGED_FILES
+async def list_staged_files(ctx, page: str = None):
+    """
+    Lists all files currently in the staging area, one page at a time.
+    Usage: DuDe liststaged or DuDe liststaged page=2
+    """
+    total = await run_blocking(STAGING_AREA.count)
     
-    if not STAGED_FILES:
+    if not total:
         await ctx.send("No files are currently staged.")
         return
     
-    response = f"Currently staged files ({len(STAGED_FILES)}):\n\n"
-    for i, file in enumerate(sorted(STAGED_FILES), 1):
-        response += f"{i}. {file}\n"
+    try:
+        page = parse_page(page)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
     
-    await ctx.send(response)
+    paginator = Paginator(
+        title="Staged files",
+        total=total,
+        fetch=lambda offset, limit: STAGING_AREA.list(offset=offset, limit=limit),
+        format_item=lambda i, file: f"{i}. {file}",
+        header=f"Currently staged files ({total})",
+    )
+    await send_paginated(ctx, paginator, page)
 
 @bot.command(name='commit')
 async def commit_files(ctx, *, message=None):
     """
-    Commits the staged files.
+    Commits the staged files by sending their emails over SMTP (see SMTP_* settings).
     Usage: DuDe commit message="Your commit message here"
     """
-    global STAGED_FILES
-    
-    if not STAGED_FILES:
-        await ctx.send("No files are staged for commit. Use `DuDe stagefile` to stage files first.")
-        return
-    
     # Extract commit message if provided
     commit_message = "No message provided"
     if message:
@@ -432,19 +661,56 @@ async def commit_files(ctx, *, message=None):
         if match:
             commit_message = match.group(1)
     
-    # This is a placeholder for future implementation
-    # For now, just acknowledge the staged files
-    files_list = list(STAGED_FILES)
-    file_count = len(files_list)
-    
-    # TODO: Implement actual commit functionality
+    try:
+        dispatcher = EmailDispatcher()
+    except ValueError as e:
+        await ctx.send(f"Email sending is not configured: {e}")
+        return
+
+    # Claim the staged files so another bot instance can't send them at the same time
+    commit_id, files_list = await run_blocking(STAGING_AREA.claim_for_commit)
     
-    # Clear the staging area after commit
-    STAGED_FILES.clear()
+    if not files_list:
+        await ctx.send("No files are staged for commit. Use `DuDe stagefile` to stage files first.")
+        return
     
-    await ctx.send(f"Committed {file_count} files with message: \"{commit_message}\"\n" +
-                   f"Files that would be processed: {', '.join(files_list)}\n" +
-                   "Note: This is a placeholder. The actual commit function is not yet implemented.")
+    # Filled in as emails go out, so a failure part-way still knows what was delivered
+    result = DispatchResult()
+    try:
+        # Load the staged emails; files without an address or content stay staged
+        emails = []
+        skipped = []
+        for file in files_list:
+            try:
+                emails.append(await run_blocking(load_outbound_email, os.path.join(COLDLEADS_FOLDER, file)))
+            except Exception as e:
+                skipped.append(f"{file} ({e})")
+
+        if emails:
+            await ctx.send(f"Sending {len(emails)} email(s) for commit \"{commit_message}\"...")
+            await dispatcher.dispatch(emails, result)
+    finally:
+        # Sent files leave the staging area (and are never sent twice); everything else is released and stays staged
+        await run_blocking(STAGING_AREA.finish_commit, commit_id, result.sent)
+        await run_blocking(LEAD_STORE.mark_sent, result.sent)
+
+    if not emails:
+        await send_long(ctx, "None of the staged files can be sent:\n" + "\n".join(skipped) +
+                        "\nUse `DuDe add_gmail` to add recipient addresses.")
+        return
+
+    response = (f"Committed \"{commit_message}\": sent {len(result.sent)} email(s) in {result.elapsed:.1f}s "
+                f"({result.rate:.1f} msg/s).")
+    if result.failed:
+        response += "\nFailed (still staged):\n" + "\n".join(f"{file}: {error}" for file, error in result.failed.items())
+    if skipped:
+        response += "\nSkipped (still staged):\n" + "\n".join(skipped)
+    await send_long(ctx, response)
+
+async def send_long(ctx, text):
+    """Send ``text`` as as many messages as Discord's 2000 character limit needs."""
+    for chunk in chunk_text(text, limit=MESSAGE_LIMIT):
+        await ctx.send(chunk)
 
 @bot.command(name='help_git')
 async def help_git(ctx):
@@ -455,8 +721,8 @@ async def help_git(ctx):
 `DuDe stagefile file1.json file2.json` - Stage specific files
 `DuDe unstagefile .` - Unstage all files
 `DuDe unstagefile file1.json file2.json` - Unstage specific files
-`DuDe liststaged` - List all currently staged files
-`DuDe commit message="Your commit message"` - Commit staged files with a message
+`DuDe liststaged` - List all currently staged files (`page=2` for the next page)
+`DuDe commit message="Your commit message"` - Send the emails in the staged files
 `DuDe help_git` - Show this help message
 
 **Examples:**
@@ -468,42 +734,112 @@ async def help_git(ctx):
     await ctx.send(help_text)
 
 @bot.command(name='runemailcrew')
-async def run_email_crew(ctx):
-    """Runs the Email automation multi AI agent crew to process leads in the businesses.json file."""
+async def run_email_crew(ctx, option: str = None):
+    """
+    Runs the Email automation multi AI agent crew to process pending leads in the lead store.
+    Companies that already have a coldleads file are skipped; use `DuDe runemailcrew force` to regenerate them.
+    """
+    force = option == "force"
     try:
-        # Check if there are any leads in the businesses.json file
-        with open(JSON_FILE, 'r') as f:
-            businesses = json.load(f)
+        # Check if there are any pending (or resumable) leads
+        pending_count = await run_blocking(LEAD_STORE.count, statuses=RESUMABLE)
         
-        if not businesses:
+        if not pending_count:
             await ctx.send("No leads found in the database. Please add leads first using the `addlead` command.")
             return
         
-        await ctx.send(f"Starting Email automation for {len(businesses)} leads. This may take some time...")
+        def run_email_automation(job):
+            # Imported here (in the job thread) if the background preload hasn't finished yet
+            run = load_crew_run()
+            return run(cancel_event=job.cancel_event, progress=job.report, force=force)
         
-        # Create a thread to run the email automation to avoid blocking the bot
-        def run_email_automation():
-            try:
-                run()
-                # Send a follow-up message when done
-                asyncio.run_coroutine_threadsafe(
-                    ctx.send("Email automation completed successfully!"), 
-                    bot.loop
-                )
-            except Exception as e:
-                # Send error message if something goes wrong
-                error_message = f"Error during email automation: {str(e)}"
-                asyncio.run_coroutine_threadsafe(
-                    ctx.send(error_message),
-                    bot.loop
-                )
+        def report_result(job):
+            # Send a follow-up message when done
+            if job.status == 'failed':
+                message = f"Error during email automation (job #{job.id}): {job.error}"
+            else:
+                summary = job.result or {}
+                message = (f"Email automation job #{job.id} {job.status}! Processed {summary.get('processed', 0)} lead(s)"
+                           f" ({summary.get('resumed', 0)} resumed from checkpoints) at {job.throughput:.1f} leads/min.")
+                if summary.get('llm_calls'):
+                    message += f"\n{summary['llm_calls']} LLM call(s), {summary['leads_per_llm_call']} leads/call."
+                if summary.get('skipped'):
+                    message += f"\nSkipped {summary['skipped']} lead(s) already in coldleads (use `DuDe runemailcrew force` to regenerate)."
+                if summary.get('failed'):
+                    message += f"\nWill retry next run: {', '.join(summary['failed'])}"
+                if summary.get('dead'):
+                    message += f"\nGave up on: {', '.join(summary['dead'])} (see `DuDe listfailedleads`)"
+            asyncio.run_coroutine_threadsafe(ctx.send(message), bot.loop)
         
-        # Start the thread
-        threading.Thread(target=run_email_automation).start()
+        # One batch per lead store at a time; the scheduler hands back the active job otherwise
+        job, created = JOB_SCHEDULER.submit(
+            key=f"runemailcrew:{LEAD_STORE.path}",
+            func=run_email_automation,
+            description="runemailcrew",
+            on_done=report_result,
+        )
+        if not created:
+            await ctx.send(f"Email automation is already {job.status} as job #{job.id}. Use `DuDe jobstatus {job.id}` to follow it.")
+            return
+        
+        await ctx.send(f"Starting Email automation for {pending_count} leads as job #{job.id}. This may take some time...")
         
     except Exception as e:
         await ctx.send(f"Error starting email automation: {str(e)}")
 
+@bot.command(name='jobstatus')
+async def job_status(ctx, job_id: str = None):
+    """
+    Shows progress of email automation jobs: leads done, failures, leads/min and ETA.
+    Usage: DuDe jobstatus (all recent jobs), DuDe jobstatus page=2 or DuDe jobstatus 3
+    """
+    if job_id is not None and job_id.isdigit():
+        job = JOB_SCHEDULER.get(int(job_id))
+        if job is None:
+            await ctx.send(f"No job #{job_id} found.")
+            return
+        await ctx.send(job.summary()[:MESSAGE_LIMIT])
+        return
+    
+    try:
+        page = parse_page(job_id)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+    
+    jobs = JOB_SCHEDULER.list()
+    if not jobs:
+        await ctx.send("No email automation jobs yet. Start one with `DuDe runemailcrew`.")
+        return
+    
+    # Queued and running jobs first, then the most recently finished
+    jobs.sort(key=lambda job: (job.status not in ACTIVE, -job.id))
+    active = sum(1 for job in jobs if job.status in ACTIVE)
+    paginator = Paginator(
+        title="Email automation jobs",
+        total=len(jobs),
+        fetch=lambda offset, limit: jobs[offset : offset + limit],
+        format_item=lambda i, job: job.summary(),
+        page_size=10,
+        header=f"{active} active, {len(jobs) - active} finished",
+    )
+    await send_paginated(ctx, paginator, page)
+
+@bot.command(name='canceljob')
+async def cancel_job(ctx, job_id: int = None):
+    """
+    Cancels a queued or running email automation job. Leads already in flight finish; the rest stay pending.
+    Usage: DuDe canceljob 3
+    """
+    if job_id is None:
+        await ctx.send("Usage: DuDe canceljob <job id>")
+        return
+    
+    if JOB_SCHEDULER.cancel(job_id):
+        await ctx.send(f"Cancelling job #{job_id}. Leads already in progress will finish first.")
+    else:
+        await ctx.send(f"Job #{job_id} is not queued or running.")
+
 # Run the bot
 if __name__ == '__main__':
     # Check if token is available
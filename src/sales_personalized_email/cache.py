@@ -0,0 +1,139 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(*parts):
+    """Content hash of any JSON-serialisable parts (model, messages, settings, ...)."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-level cache: an in-memory LRU in front of an optional SQLite store.
+
+    Entries older than ``ttl`` seconds are treated as missing, and the disk
+    store is trimmed to the ``max_entries`` most recently used rows. Several
+    caches can share one database file by using different namespaces.
+    """
+
+    def __init__(self, path=None, namespace="default", ttl=7 * 24 * 3600, max_entries=10000, memory_entries=256):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, created)
+        self._writes_since_trim = 0
+
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS response_cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache (namespace, accessed)"
+            )
+
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key, record=True):
+        """
+        Return the cached value for ``key``, or None on a miss.
+
+        ``record=False`` leaves the hit/miss counters alone, for a second look
+        at a key whose lookup was already counted.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                if record:
+                    self.hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created FROM response_cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row and not self._expired(row[1], now):
+                    self._conn.execute(
+                        "UPDATE response_cache SET accessed = ? WHERE namespace = ? AND key = ?",
+                        (now, self.namespace, key),
+                    )
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    if record:
+                        self.hits += 1
+                    return value
+
+            if record:
+
+                self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (namespace, key, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now, now),
+            )
+            # Trimming needs a count, so only do it every so often
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 100:
+                self._writes_since_trim = 0
+                self._trim(now)
+
+    def _trim(self, now):
+        if self.ttl is not None:
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE namespace = ? AND created < ?",
+                (self.namespace, now - self.ttl),
+            )
+        self._conn.execute(
+            """DELETE FROM response_cache WHERE namespace = ? AND key IN (
+                SELECT key FROM response_cache WHERE namespace = ?
+                ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.namespace, self.namespace, self.max_entries),
+        )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
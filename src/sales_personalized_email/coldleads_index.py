@@ -0,0 +1,372 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from .lead_store import DEFAULT_DB_PATH, company_key, connect
+
+COLDLEADS_FOLDER = "coldleads"
+OUTPUT_SUFFIX = "_personalized_email.json"
+
+# Columns of the full-text index, with the bm25 weight of a match in each.
+# A hit in the company name or subject says more than one in the body
+SEARCH_WEIGHTS = {
+    "company": 5.0,
+    "subject_line": 3.0,
+    "email_body": 1.0,
+    "follow_up_notes": 2.0,
+    "industry": 2.0,
+    "business_type": 2.0,
+    "location": 2.0,
+}
+# Prefixes accepted in search queries, e.g. notes:demo
+SEARCH_FIELDS = {
+    "company": "company",
+    "subject": "subject_line",
+    "body": "email_body",
+    "notes": "follow_up_notes",
+    "industry": "industry",
+    "type": "business_type",
+    "location": "location",
+}
+
+# bm25 is computed for every match before sorting; past this many matches
+# the ranking says little anyway, so results are listed newest first instead
+RANKED_MATCH_LIMIT = 40000
+
+_SEARCH_TERM = re.compile(r'(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+
+
+def output_filename(company):
+    """Name of the generated email file for a company."""
+    return f"{company_key(company)}{OUTPUT_SUFFIX}"
+
+
+def _company_from_filename(filename):
+    name = filename[: -len(OUTPUT_SUFFIX)] if filename.endswith(OUTPUT_SUFFIX) else filename[: -len(".json")]
+    return name.replace("_", " ").title()
+
+
+def search_expression(query):
+    """
+    Turn a search box query into an FTS5 expression.
+
+    Words and "quoted phrases" must all match; ``notes:demo`` limits a term to
+    one field and a trailing ``*`` matches a prefix. Everything else is
+    quoted, so user input is never parsed as FTS5 syntax.
+    """
+    parts = []
+    for match in _SEARCH_TERM.finditer(query):
+        field, phrase, word = match.groups()
+        column = SEARCH_FIELDS.get(field.lower()) if field else None
+        if field and column is None:
+            # Not a field we know: "re:order" is just a term
+            phrase, word = None, match.group(0)
+        prefix = phrase is None and word.endswith("*")
+        term = phrase if phrase is not None else word.rstrip("*")
+        if not term.strip():
+            continue
+        expression = '"' + term.replace('"', '""') + '"' + (" *" if prefix else "")
+        parts.append(f"{column} : {expression}" if column else expression)
+    if not parts:
+        raise ValueError("Nothing to search for")
+    return " ".join(parts)
+
+
+def read_lead_file(path):
+    """Extract the manifest and search fields from one generated email file."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    # Older files hold a list with the lead as first item
+    lead = data[0] if isinstance(data, list) and data else data
+    if not isinstance(lead, dict):
+        lead = {}
+    return {
+        "company": lead.get("company"),
+        "subject_line": lead.get("subject_line"),
+        "has_email": int(bool(lead.get("email"))),
+        "email_body": lead.get("email_body"),
+        "follow_up_notes": lead.get("follow_up_notes"),
+    }
+
+
+class ColdLeadsIndex:
+    """
+    Manifest of the coldleads folder kept in the lead database.
+
+    Listing, showing and staging read the manifest instead of scanning and
+    parsing every file. The folder is only rescanned when its mtime changes
+    (a file was added or removed), and then only new or modified files are
+    parsed. In-place edits go through update_file(). A file's number is its
+    manifest sequence, assigned when it is first indexed and never reused,
+    so numbers stay stable between commands even as other files come and go
+    (and may have gaps where files were removed).
+
+    Filenames are also kept in an FTS5 trigram index, so substring lookups
+    (showlead, stagefile patterns) don't scan every name. A second FTS5 index
+    over the email text and the lead's industry/type/location backs
+    searchleads; both are updated together with the manifest row.
+    """
+
+    def __init__(self, folder=COLDLEADS_FOLDER, path=None):
+        self.folder = folder
+        self._lock = threading.RLock()
+        self._conn = connect(path or os.getenv("LEADS_DB", DEFAULT_DB_PATH))
+        self._folder_mtime = None
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS coldleads_manifest (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL UNIQUE,
+                company TEXT,
+                subject_line TEXT,
+                has_email INTEGER NOT NULL DEFAULT 0,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+            """
+        )
+        self.has_name_index = self._create_name_index()
+        self.has_search_index = self._create_search_index()
+
+    def _create_name_index(self):
+        """Create the trigram filename index, or return False if this SQLite build lacks FTS5 trigram."""
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS coldleads_names USING fts5(filename, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        # Backfill names indexed before the trigram table existed
+        self._conn.execute(
+            """INSERT INTO coldleads_names (rowid, filename)
+               SELECT seq, filename FROM coldleads_manifest
+               WHERE seq NOT IN (SELECT rowid FROM coldleads_names)"""
+        )
+        return True
+
+    def _create_search_index(self):
+        """Create the full-text index over email text and lead details, or return False without FTS5."""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'coldleads_search'"
+        ).fetchone()
+        try:
+            self._conn.execute(
+                f"""CREATE VIRTUAL TABLE IF NOT EXISTS coldleads_search
+                    USING fts5({', '.join(SEARCH_WEIGHTS)}, tokenize='porter unicode61')"""
+            )
+        except sqlite3.OperationalError:
+            return False
+        if not exists:
+            # Files indexed before the search table existed have to be read once more
+            rows = self._conn.execute("SELECT seq, filename, company FROM coldleads_manifest").fetchall()
+            self._conn.execute("BEGIN")
+            try:
+                for row in rows:
+                    try:
+                        fields = read_lead_file(os.path.join(self.folder, row["filename"]))
+                    except (OSError, ValueError):
+                        fields = {}
+                    self._index_text(row["seq"], row["filename"], {**fields, "company": row["company"]})
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def _lead_details(self, filename):
+        """Industry, business type and location of the lead a file was written for."""
+        if not filename.endswith(OUTPUT_SUFFIX):
+            return {}
+        try:
+            row = self._conn.execute(
+                "SELECT industry, business_type, location FROM leads WHERE company_key = ? ORDER BY id LIMIT 1",
+                (filename[: -len(OUTPUT_SUFFIX)],),
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # No lead store in this database
+            return {}
+        return dict(row) if row else {}
+
+    def _index_text(self, seq, filename, fields):
+        fields = {**fields, **self._lead_details(filename)}
+        self._conn.execute("DELETE FROM coldleads_search WHERE rowid = ?", (seq,))
+        self._conn.execute(
+            f"INSERT INTO coldleads_search (rowid, {', '.join(SEARCH_WEIGHTS)}) VALUES (?{', ?' * len(SEARCH_WEIGHTS)})",
+            (seq, *(fields.get(column) for column in SEARCH_WEIGHTS)),
+        )
+
+    def _delete(self, filenames):
+        for filename in filenames:
+            row = self._conn.execute("SELECT seq FROM coldleads_manifest WHERE filename = ?", (filename,)).fetchone()
+            if row is None:
+                continue
+            if self.has_name_index:
+                self._conn.execute("DELETE FROM coldleads_names WHERE rowid = ?", (row["seq"],))
+            if self.has_search_index:
+                self._conn.execute("DELETE FROM coldleads_search WHERE rowid = ?", (row["seq"],))
+            self._conn.execute("DELETE FROM coldleads_manifest WHERE seq = ?", (row["seq"],))
+
+    def _upsert(self, filename, stat):
+        try:
+            fields = read_lead_file(os.path.join(self.folder, filename))
+        except (OSError, ValueError):
+            # Unreadable or half-written file: list it by name only
+            fields = {"company": None, "subject_line": None, "has_email": 0}
+        fields["company"] = fields["company"] or _company_from_filename(filename)
+        self._conn.execute(
+            """INSERT INTO coldleads_manifest (filename, company, subject_line, has_email, mtime, size)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (filename) DO UPDATE SET
+                   company = excluded.company, subject_line = excluded.subject_line,
+                   has_email = excluded.has_email, mtime = excluded.mtime, size = excluded.size""",
+            (
+                filename,
+                fields["company"],
+                fields["subject_line"],
+                fields["has_email"],
+                stat.st_mtime,
+                stat.st_size,
+            ),
+        )
+        seq = self._conn.execute("SELECT seq FROM coldleads_manifest WHERE filename = ?", (filename,)).fetchone()[0]
+        if self.has_name_index:
+            self._conn.execute("DELETE FROM coldleads_names WHERE rowid = ?", (seq,))
+            self._conn.execute("INSERT INTO coldleads_names (rowid, filename) VALUES (?, ?)", (seq, filename))
+        if self.has_search_index:
+            self._index_text(seq, filename, fields)
+
+    def refresh(self, force=False):
+        """Bring the manifest up to date if the folder changed since the last refresh."""
+        with self._lock:
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+            if folder_mtime == self._folder_mtime and not force:
+                return
+
+            known = {
+                row["filename"]: (row["mtime"], row["size"])
+                for row in self._conn.execute("SELECT filename, mtime, size FROM coldleads_manifest")
+            }
+            self._conn.execute("BEGIN")
+            try:
+                with os.scandir(self.folder) as entries:
+                    for entry in entries:
+                        # Dotfiles (like in-progress atomic writes) are not leads
+                        if entry.name.startswith(".") or not entry.name.endswith(".json") or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                        if known.pop(entry.name, None) != (stat.st_mtime, stat.st_size):
+                            self._upsert(entry.name, stat)
+                # Whatever is left was deleted from the folder
+                self._delete(known)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._folder_mtime = folder_mtime
+
+    def update_file(self, filename):
+        """Re-index one file after it was written or edited in place."""
+        path = os.path.join(self.folder, filename)
+        with self._lock:
+            if os.path.exists(path):
+                self._upsert(filename, os.stat(path))
+            else:
+                self._delete([filename])
+
+    def count(self):
+        self.refresh()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM coldleads_manifest").fetchone()[0]
+
+    def list(self, offset=0, limit=-1):
+        """Manifest entries in stable order, each with its number (see by_number)."""
+        self.refresh()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM coldleads_manifest ORDER BY seq LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [dict(row, number=row["seq"]) for row in rows]
+
+    def filenames(self):
+        return [entry["filename"] for entry in self.list()]
+
+    def by_number(self, number):
+        """The entry shown as ``number`` by listcoldleads, or None."""
+        self.refresh()
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM coldleads_manifest WHERE seq = ?", (number,)).fetchone()
+        return dict(row, number=row["seq"]) if row else None
+
+    def get(self, filename):
+        self.refresh()
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM coldleads_manifest WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def find(self, pattern):
+        """Filenames containing ``pattern`` (case-insensitive), exact match first."""
+        self.refresh()
+        with self._lock:
+            return self._find(pattern)
+
+    def _find(self, pattern):
+        if self._conn.execute("SELECT 1 FROM coldleads_manifest WHERE filename = ?", (pattern,)).fetchone():
+            exact = [pattern]
+        else:
+            exact = []
+
+        # Trigrams need at least 3 characters; shorter patterns fall back to a scan
+        if self.has_name_index and len(pattern) >= 3:
+            rows = self._conn.execute(
+                "SELECT filename FROM coldleads_names WHERE coldleads_names MATCH ? ORDER BY rowid",
+                ('"' + pattern.replace('"', '""') + '"',),
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT filename FROM coldleads_manifest WHERE filename LIKE ? ESCAPE '\\' ORDER BY seq",
+                ("%" + pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",),
+            ).fetchall()
+        return exact + [row["filename"] for row in rows if row["filename"] != pattern]
+
+    def _search_index(self):
+        if not self.has_search_index:
+            raise RuntimeError("Full-text search needs a SQLite build with FTS5")
+
+    def _count_matches(self, expression):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM coldleads_search WHERE coldleads_search MATCH ?", (expression,)
+        ).fetchone()[0]
+
+    def search_count(self, query):
+        """Number of files matching a search query (see search_expression)."""
+        self._search_index()
+        expression = search_expression(query)
+        self.refresh()
+        with self._lock:
+            return self._count_matches(expression)
+
+    def search(self, query, offset=0, limit=-1):
+        """Files matching a search query, best match first, each with a snippet of the matching text."""
+        self._search_index()
+        expression = search_expression(query)
+        self.refresh()
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS.values())
+        with self._lock:
+            if self._count_matches(expression) > RANKED_MATCH_LIMIT:
+                order = "coldleads_search.rowid DESC"
+            else:
+                order = f"bm25(coldleads_search, {weights})"
+            rows = self._conn.execute(
+                f"""SELECT m.filename, m.company, m.subject_line,
+                           snippet(coldleads_search, -1, '**', '**', '...', 12) AS snippet
+                    FROM coldleads_search JOIN coldleads_manifest m ON m.seq = coldleads_search.rowid
+                    WHERE coldleads_search MATCH ?
+                    ORDER BY {order}
+                    LIMIT ? OFFSET ?""",
+                (expression, limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
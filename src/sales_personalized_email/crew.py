@@ -1,62 +1,199 @@
-from crewai_tools import ScrapeWebsiteTool, SerperDevTool
 from pydantic import BaseModel
+from typing import List
+import functools
+import json
 import os
+import threading
 import time
-import re
+import yaml
 from dotenv import load_dotenv
 
 from crewai import Agent, Crew, Process, Task, LLM
 from crewai.project import CrewBase, agent, crew, task
+from litellm import token_counter
+
+from .cache import ResponseCache, cache_key
+from .coldleads_index import COLDLEADS_FOLDER, output_filename
+from .metrics import TRACER
+from .research_brief import DEFAULT_TOKEN_BUDGET, compact_research
+from .storage import update_json
+from .tools.cached_search_tool import CachedSearchTool
+from .rate_limiter import (  # noqa: F401 (RateLimiter re-exported)
+    RateLimiter,
+    backoff_delay,
+    is_rate_limit_error,
+    key_fingerprint,
+    retry_after_seconds,
+    shared_limiter,
+)
 
 # Load environment variables
 load_dotenv()
 
-# Create a simple rate limiter for API calls
-class RateLimiter:
-    def __init__(self, max_calls, time_period):
-        self.max_calls = max_calls
-        self.time_period = time_period
-        self.calls = []
-    
-    def __call__(self, func):
-        def wrapper(*args, **kwargs):
-            current_time = time.time()
-            # Remove calls older than the time period
-            self.calls = [t for t in self.calls if current_time - t < self.time_period]
-            
-            # If at max calls, wait until we can make another call
-            if len(self.calls) >= self.max_calls:
-                sleep_time = self.time_period - (current_time - self.calls[0])
-                if sleep_time > 0:
-                    print(f"Rate limit reached. Waiting {sleep_time:.2f} seconds...")
-                    time.sleep(sleep_time)
-            
-            # Add this call and execute
-            self.calls.append(time.time())
-            return func(*args, **kwargs)
-        return wrapper
+# Gemini's free tier allows 15 requests per minute per API key
+GEMINI_RPM = 15
+
+
+def estimate_tokens(model, messages=None, text=None):
+    """Token count from litellm's tokenizer for ``model``, or ~4 characters per token if that fails."""
+    try:
+        if messages is not None:
+            return token_counter(model=model, messages=messages)
+        return token_counter(model=model, text=text or "")
+    except Exception:
+        content = text if messages is None else json.dumps(messages, default=str)
+        return len(content or "") // 4
+
+
+class _ApiKeySlot:
+    """One API key in the pool, with its own bucket and a cooldown set after a 429."""
+
+    def __init__(self, llm, limiter, fingerprint):
+        self.llm = llm
+        self.limiter = limiter
+        self.fingerprint = fingerprint
+        self.cooldown_until = 0.0
+
+    def expected_wait(self, now):
+        return max(self.cooldown_until - now, 0.0) + self.limiter.estimated_wait()
+
 
 # Initialize Gemini LLM with rate limiting
 class RateLimitedLLM(LLM):
-    def __init__(self, *args, **kwargs):
+    """
+    LLM that spreads calls across a pool of API keys, each with its own bucket.
+
+    Calls go to whichever key can serve them soonest. A 429 from the server puts
+    that key on a jittered exponential cooldown (at least as long as its
+    Retry-After) and the call is retried, normally on another key.
+
+    When a ResponseCache is given, identical requests (same model, messages and
+    temperature) are answered from it without touching the rate limiter.
+    """
+
+    # Set on this LLM at run time (CrewAI's executor adds its stop words to
+    # ``stop``) and copied to the per-key delegate before every request
+    RUNTIME_ATTRIBUTES = (
+        "stop",
+        "temperature",
+        "top_p",
+        "max_tokens",
+        "max_completion_tokens",
+        "response_format",
+        "seed",
+    )
+
+    def __init__(self, *args, api_keys=None, rate_limiter=None, max_retries=5, cache=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.rate_limiter = RateLimiter(max_calls=15, time_period=60)
-    
-    # Override the invoke method instead of trying to wrap it in the constructor
+        self.max_retries = max_retries
+        self.cache = cache
+
+        keys = api_keys or [kwargs.get("api_key")]
+        self._slot_lock = threading.Lock()
+        self._slots = []
+        # Requests actually sent to the API (cache hits excluded, retries included)
+        self.api_calls = 0
+        for key in keys:
+            fingerprint = key_fingerprint(key)
+            # Buckets are registered per key, so every LLM using a key shares its
+            # budget; an explicit rate_limiter overrides that for all keys
+            limiter = rate_limiter or shared_limiter(f"gemini:{fingerprint}", max_calls=GEMINI_RPM, time_period=60)
+            llm = LLM(*args, **{**kwargs, "api_key": key})
+            self._slots.append(_ApiKeySlot(llm, limiter, fingerprint))
+
+    def _pick_slot(self):
+        now = time.time()
+        with self._slot_lock:
+            return min(self._slots, key=lambda slot: slot.expected_wait(now))
+
+    # CrewAI agents go through call(), so the limit has to be enforced here
+    # for every crew sharing this LLM to draw from the same budget
+    def call(self, messages, *args, **kwargs):
+        with TRACER.span("llm", self.model):
+            # Tool-calling requests can have side effects, so only plain completions are cached
+            key = None
+            if self.cache is not None and not kwargs.get("available_functions"):
+                key = cache_key(self.model, messages, self.temperature)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    TRACER.add(cache_hits=1)
+                    return cached
+
+            response = self._call_with_retries(messages, *args, **kwargs)
+            # The delegate returns only text, so usage is counted with the model's tokenizer
+            TRACER.add(
+                tokens_in=estimate_tokens(self.model, messages=messages),
+                tokens_out=estimate_tokens(self.model, text=response if isinstance(response, str) else str(response)),
+            )
+            if key is not None and isinstance(response, str):
+                self.cache.set(key, response)
+            return response
+
+    def _call_with_retries(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            slot = self._pick_slot()
+            waiting_since = time.perf_counter()
+            cooldown = slot.cooldown_until - time.time()
+            if cooldown > 0:
+                time.sleep(cooldown)
+            slot.limiter.acquire()
+            TRACER.add(wait_s=time.perf_counter() - waiting_since)
+            with self._slot_lock:
+                self.api_calls += 1
+
+            for name in self.RUNTIME_ATTRIBUTES:
+                setattr(slot.llm, name, getattr(self, name, None))
+            try:
+                return slot.llm.call(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, retry_after_seconds(e))
+                with self._slot_lock:
+                    slot.cooldown_until = max(slot.cooldown_until, time.time() + delay)
+                print(f"Rate limited by the server on key {slot.fingerprint}. Cooling it down for {delay:.2f} seconds...")
+                TRACER.add(rate_limited=1)
+                attempt += 1
+
+    # Kept for callers using the older invoke() entry point
     def invoke(self, *args, **kwargs):
-        # First apply the rate limiter
-        @self.rate_limiter
-        def rate_limited_invoke(self, *args, **kwargs):
-            # Call the parent class's invoke method
-            return super(RateLimitedLLM, self).invoke(*args, **kwargs)
-        
-        # Call the rate-limited version
-        return rate_limited_invoke(self, *args, **kwargs)
+        return self.call(*args, **kwargs)
+
+    def limiter_stats(self):
+        """Wait-time stats per API key fingerprint."""
+        return {slot.fingerprint: slot.limiter.stats() for slot in self._slots}
+
+    def cache_stats(self):
+        """Hit/miss counters of the response cache, or None when caching is off."""
+        return self.cache.stats() if self.cache is not None else None
+
+
+def gemini_api_keys():
+    """API keys from GEMINI_API_KEYS (comma separated), falling back to GEMINI_API_KEY."""
+    keys = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+    return keys or [os.getenv("GEMINI_API_KEY")]
+
+
+def llm_response_cache():
+    """Response cache stored at LLM_CACHE_PATH, or None when the cache isn't enabled."""
+    path = os.getenv("LLM_CACHE_PATH")
+    if not path:
+        return None
+    return ResponseCache(
+        path=path,
+        namespace="llm",
+        ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000)),
+    )
+
 
 # Initialize rate-limited Gemini LLM
 gemini_llm = RateLimitedLLM(
     model="gemini/gemini-2.0-flash",
-    api_key=os.getenv("GEMINI_API_KEY")
+    api_key=gemini_api_keys()[0],
+    api_keys=gemini_api_keys(),
+    cache=llm_response_cache(),
 )
 
 class PersonalizedEmail(BaseModel):
@@ -65,6 +202,113 @@ class PersonalizedEmail(BaseModel):
     follow_up_notes: str
 
 
+class LeadResearch(BaseModel):
+    company: str
+    achievement: str = ""
+    challenges: str = ""
+    industry_trends: str = ""
+    business_needs: str = ""
+    growth_opportunities: str = ""
+
+    def as_text(self):
+        """Render in the shape of research_sme_task's output, to be used as a research checkpoint."""
+        return (
+            f"Profile of {self.company}:\n"
+            f"1. Achievement: {self.achievement}\n"
+            f"2. Challenges: {self.challenges}\n"
+            f"3. Industry trends: {self.industry_trends}\n"
+            f"4. Business needs and pain points: {self.business_needs}\n"
+            f"5. Growth opportunities: {self.growth_opportunities}"
+        )
+
+
+class BatchResearch(BaseModel):
+    leads: List[LeadResearch]
+
+
+def save_email(filename, output):
+    """Write the email JSON under the file's lock, keeping an address added with add_gmail"""
+    email = output.json_dict or json.loads(output.raw)
+
+    def merge(existing):
+        if isinstance(existing, dict) and existing.get("email"):
+            return {**email, "email": existing["email"]}
+        return email
+
+    update_json(os.path.join(COLDLEADS_FOLDER, filename), merge, default={})
+
+
+def add_context(task, heading, text):
+    """Append precomputed material under ``heading`` to a task's description."""
+    # Braces would be read as input placeholders when the task is interpolated
+    text = text.replace("{", "(").replace("}", ")")
+    task.description += f"\n\n{heading}:\n{text}"
+    return task
+
+
+def add_research(write_task, research):
+    """Append earlier research findings to the write task's description."""
+    return add_context(write_task, "Research findings about {company} to base the email on", research)
+
+
+class LeadCallbacks:
+    """
+    What every crew does with one lead's task outputs, whichever way it was built.
+
+    task_callback(task_name, task_output) is called as each task finishes,
+    which is how runs checkpoint their progress. The research is cut down to
+    a brief before the copywriter sees it, and the email is written to the
+    lead's file in coldleads.
+    """
+
+    def __init__(self, company_name=None, task_callback=None, llm=None, brief_tokens=None):
+        self.company_name = company_name
+        self.task_callback = task_callback
+        self.llm = llm or gemini_llm
+        # Token budget of the research brief handed to the copywriter; 0 passes the full research
+        if brief_tokens is None:
+            brief_tokens = int(os.getenv("RESEARCH_BRIEF_TOKENS", DEFAULT_TOKEN_BUDGET))
+        self.brief_tokens = brief_tokens
+
+    def output_filename(self):
+        """Generate a filename based on company name or use default"""
+        if self.company_name:
+            # Create a safe filename from the company name
+            return output_filename(self.company_name)
+        return "sme_personalized_email.json"
+
+    def callback_for(self, task_name):
+        if self.task_callback is None:
+            return None
+        return lambda output: self.task_callback(task_name, output)
+
+    def compact(self, research):
+        """The research cut down to the brief the copywriter works from."""
+        if not self.brief_tokens:
+            return research
+        with TRACER.span("stage", "compact_research", lead=self.company_name):
+            brief, before, after = compact_research(
+                research,
+                self.brief_tokens,
+                count_tokens=lambda text: estimate_tokens(self.llm.model, text=text),
+            )
+            TRACER.add(tokens_before=before, tokens_after=after, tokens_saved=max(before - after, 0))
+        print(f"Research brief for {self.company_name}: {before} -> {after} tokens")
+        return brief
+
+    def research_done(self, output):
+        # The full research is what gets checkpointed...
+        if self.task_callback is not None:
+            self.task_callback("research_sme_task", output)
+        # ...but the write task takes this output as its context, so it only sees the brief
+        output.raw = self.compact(output.raw)
+
+    def email_done(self, output):
+        save_email(self.output_filename(), output)
+        if self.task_callback is not None:
+            self.task_callback("write_sme_email_task", output)
+
+
 @CrewBase
 class SalesPersonalizedEmailCrew:
     """SalesPersonalizedEmail crew for SMEs"""
@@ -72,24 +316,25 @@ class SalesPersonalizedEmailCrew:
     agents_config = "config/agents.yaml"
     tasks_config = "config/tasks.yaml"
     
-    def __init__(self, company_name=None):
-        """Initialize the crew with an optional company name"""
+    def __init__(self, company_name=None, task_callback=None):
+        """
+        Initialize the crew with an optional company name.
+
+        task_callback(task_name, task_output) is called as each task finishes,
+        which is how runs checkpoint their progress.
+        """
         self.company_name = company_name
+        self.task_callback = task_callback
+        self.callbacks = LeadCallbacks(company_name, task_callback)
 
     def get_output_filename(self):
-        """Generate a filename based on company name or use default"""
-        if self.company_name:
-            # Create a safe filename from the company name
-            safe_name = re.sub(r'[^\w\s-]', '', self.company_name).strip().lower()
-            safe_name = re.sub(r'[\s-]+', '_', safe_name)
-            return f"{safe_name}_personalized_email.json"
-        return "sme_personalized_email.json"
+        return self.callbacks.output_filename()
 
     @agent
     def sme_researcher(self) -> Agent:
         return Agent(
             config=self.agents_config["sme_researcher"],
-            tools=[SerperDevTool()],
+            tools=[CachedSearchTool()],
             allow_delegation=False,
             verbose=True,
             llm=gemini_llm,
@@ -110,20 +355,22 @@ class SalesPersonalizedEmailCrew:
         return Task(
             config=self.tasks_config["research_sme_task"],
             agent=self.sme_researcher(),
+            callback=self.callbacks.research_done,
         )
 
     @task
     def write_sme_email_task(self) -> Task:
         # Create coldleads folder if it doesn't exist
-        coldleads_folder = 'coldleads'
-        if not os.path.exists(coldleads_folder):
-            os.makedirs(coldleads_folder)
-            
+        if not os.path.exists(COLDLEADS_FOLDER):
+            os.makedirs(COLDLEADS_FOLDER)
+
+        # The email file is written by the callback rather than output_file, so
+        # it goes through the same per-file lock as the bot's edits
         return Task(
             config=self.tasks_config["write_sme_email_task"],
             agent=self.sme_email_copywriter(),
             output_json=PersonalizedEmail,
-            output_file=os.path.join(coldleads_folder, self.get_output_filename()),
+            callback=self.callbacks.email_done,
         )
 
     @crew
@@ -137,3 +384,144 @@ class SalesPersonalizedEmailCrew:
             llm=gemini_llm,  # Set the default LLM for the crew
             # process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
         )
+
+    def write_only_crew(self, research) -> Crew:
+        """Creates a crew that skips research and writes the email from an earlier research output"""
+        return Crew(
+            agents=[self.sme_email_copywriter()],
+            tasks=[add_research(self.write_sme_email_task(), self.callbacks.compact(research))],
+            process=Process.sequential,
+            verbose=True,
+            llm=gemini_llm,
+        )
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), "config")
+
+
+@functools.lru_cache(maxsize=None)
+def load_config(name):
+    """Parse a YAML file from config/ once per process."""
+    with open(os.path.join(CONFIG_DIR, name), "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+class CrewFactory:
+    """
+    Builds per-lead crews from templates prepared once.
+
+    SalesPersonalizedEmailCrew re-reads both YAML files, rebuilds its search
+    tool and re-checks the coldleads folder for every lead. The factory does
+    all of that once; build() only binds the company (output file) and the
+    task callback. Agents and tasks themselves are still created per lead,
+    since CrewAI mutates them while a crew runs and leads run concurrently.
+    """
+
+    def __init__(self, llm=None, search_tool=None, brief_tokens=None):
+        self.llm = llm or gemini_llm
+        # None reads RESEARCH_BRIEF_TOKENS (see LeadCallbacks)
+        self.brief_tokens = brief_tokens
+        os.makedirs(COLDLEADS_FOLDER, exist_ok=True)
+        agents_config = load_config("agents.yaml")
+        tasks_config = load_config("tasks.yaml")
+        # Shared by every researcher: searches go through the process-wide cache anyway
+        search_tool = search_tool or CachedSearchTool()
+        self.agent_templates = {
+            "sme_researcher": dict(
+                config=agents_config["sme_researcher"],
+                tools=[search_tool],
+                allow_delegation=False,
+                verbose=True,
+                llm=self.llm,
+            ),
+            "sme_email_copywriter": dict(
+                config=agents_config["sme_email_copywriter"],
+                tools=[],
+                allow_delegation=False,
+                verbose=True,
+                llm=self.llm,
+            ),
+        }
+        self.task_templates = {
+            "research_sme_task": dict(config=tasks_config["research_sme_task"]),
+            "write_sme_email_task": dict(config=tasks_config["write_sme_email_task"], output_json=PersonalizedEmail),
+            "research_sme_batch_task": dict(config=tasks_config["research_sme_batch_task"], output_json=BatchResearch),
+        }
+
+    def build(self, company_name=None, task_callback=None):
+        """A crew for one lead, with the same interface main.run() uses on SalesPersonalizedEmailCrew."""
+        return LeadCrew(self, company_name, task_callback)
+
+    def batch_research_crew(self) -> Crew:
+        """
+        A crew that researches several leads sharing an industry and location in one agent run.
+
+        Kick it off with batch_research_inputs(); parse_batch_research() splits the
+        output into per-lead research that write_only_crew() can use.
+        """
+        template = self.agent_templates["sme_researcher"]
+        researcher = Agent(**dict(template, config=dict(template["config"])))
+        template = self.task_templates["research_sme_batch_task"]
+        task = Task(**dict(template, config=dict(template["config"])), agent=researcher)
+        return Crew(agents=[researcher], tasks=[task], process=Process.sequential, verbose=True, llm=self.llm)
+
+
+def batch_research_inputs(leads, product):
+    """Kickoff inputs for CrewFactory.batch_research_crew() over leads from one industry and location."""
+    return {
+        # The researcher's backstory names {company}; in a batch that is every company in it
+        "company": ", ".join(lead["company"] for lead in leads),
+        "industry": leads[0]["industry"],
+        "location": leads[0]["location"],
+        "companies": "\n".join(f"- {lead['company']} ({lead.get('business_type', '')})" for lead in leads),
+        "product": product,
+    }
+
+
+def parse_batch_research(output):
+    """Research text per company from a batch research CrewOutput, keyed by company."""
+    data = output.json_dict or json.loads(output.raw)
+    batch = BatchResearch.model_validate(data)
+    return {research.company: research.as_text() for research in batch.leads}
+
+
+class LeadCrew:
+    """One lead's crews, bound from a CrewFactory's templates."""
+
+    def __init__(self, factory, company_name=None, task_callback=None):
+        self.factory = factory
+        self.company_name = company_name
+        self.task_callback = task_callback
+        self.callbacks = LeadCallbacks(company_name, task_callback, factory.llm, factory.brief_tokens)
+
+    def get_output_filename(self):
+        return self.callbacks.output_filename()
+
+    def _agent(self, name):
+        # Each lead gets its own config dicts so nothing a run does leaks into the template
+        template = self.factory.agent_templates[name]
+        return Agent(**dict(template, config=dict(template["config"])))
+
+    def _task(self, name, agent, callback):
+        template = self.factory.task_templates[name]
+        return Task(**dict(template, config=dict(template["config"])), agent=agent, callback=callback)
+
+    def _crew(self, agents, tasks):
+        return Crew(agents=agents, tasks=tasks, process=Process.sequential, verbose=True, llm=self.factory.llm)
+
+    def crew(self, site_context=None) -> Crew:
+        """The full crew; ``site_context`` is text already scraped from the lead's pages, if any."""
+        researcher = self._agent("sme_researcher")
+        copywriter = self._agent("sme_email_copywriter")
+        research_task = self._task("research_sme_task", researcher, self.callbacks.research_done)
+        if site_context:
+            add_context(research_task, "Content already fetched from {company}'s website and review pages", site_context)
+        return self._crew(
+            [researcher, copywriter],
+            [research_task, self._task("write_sme_email_task", copywriter, self.callbacks.email_done)],
+        )
+
+    def write_only_crew(self, research) -> Crew:
+        copywriter = self._agent("sme_email_copywriter")
+        write_task = self._task("write_sme_email_task", copywriter, self.callbacks.email_done)
+        return self._crew([copywriter], [add_research(write_task, self.callbacks.compact(research))])
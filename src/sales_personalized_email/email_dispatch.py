@@ -0,0 +1,208 @@
+import asyncio
+import os
+import smtplib
+import time
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+from .rate_limiter import TokenBucket, backoff_delay
+from .storage import read_json, run_blocking
+
+
+@dataclass
+class SMTPConfig:
+    host: str = "localhost"
+    port: int = 587
+    username: Optional[str] = None
+    password: Optional[str] = None
+    sender: Optional[str] = None
+    starttls: bool = True
+    pool_size: int = 4
+    messages_per_connection: int = 100
+    domain_rate: int = 30  # messages per minute to any one recipient domain
+    max_retries: int = 3
+    timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls):
+        sender = os.getenv("SMTP_FROM") or os.getenv("SMTP_USERNAME")
+        if not sender:
+            raise ValueError("No sender address configured. Set SMTP_FROM (or SMTP_USERNAME)")
+        return cls(
+            host=os.getenv("SMTP_HOST", "localhost"),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            username=os.getenv("SMTP_USERNAME"),
+            password=os.getenv("SMTP_PASSWORD"),
+            sender=sender,
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+            pool_size=int(os.getenv("SMTP_POOL_SIZE", "4")),
+            messages_per_connection=int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", "100")),
+            domain_rate=int(os.getenv("SMTP_DOMAIN_RATE", "30")),
+            max_retries=int(os.getenv("SMTP_MAX_RETRIES", "3")),
+        )
+
+
+@dataclass
+class OutboundEmail:
+    filename: str
+    to: str
+    subject: str
+    body: str
+
+    @property
+    def domain(self):
+        return self.to.rsplit("@", 1)[-1].lower()
+
+
+@dataclass
+class DispatchResult:
+    sent: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        """Messages sent per second."""
+        return len(self.sent) / self.elapsed if self.elapsed else 0.0
+
+
+def load_outbound_email(path):
+    """Build an OutboundEmail from a coldleads file, or raise ValueError if it can't be sent."""
+    data = read_json(path)
+    lead = data[0] if isinstance(data, list) and data else data
+    missing = [key for key in ("email", "subject_line", "email_body") if not lead.get(key)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    return OutboundEmail(
+        filename=os.path.basename(path),
+        to=lead["email"],
+        subject=lead["subject_line"],
+        body=lead["email_body"],
+    )
+
+
+def _is_permanent(error):
+    # 5xx replies (bad mailbox, rejected content, ...) won't succeed on a retry
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class _PooledConnection:
+    """One SMTP session reused for several messages, reopened when worn out or broken."""
+
+    def __init__(self, config):
+        self.config = config
+        self.smtp = None
+        self.sent = 0
+
+    def _open(self):
+        smtp = smtplib.SMTP(self.config.host, self.config.port, timeout=self.config.timeout)
+        if self.config.starttls:
+            smtp.starttls()
+        if self.config.username:
+            smtp.login(self.config.username, self.config.password)
+        self.smtp = smtp
+        self.sent = 0
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+    def send(self, message):
+        """Blocking send; runs in an executor thread."""
+        if self.smtp is None or self.sent >= self.config.messages_per_connection:
+            self.close()
+            self._open()
+        try:
+            self.smtp.send_message(message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Drop the broken session so the retry opens a fresh one
+            self.smtp = None
+            raise
+        self.sent += 1
+
+
+class EmailDispatcher:
+    """
+    Async send pipeline over a pool of persistent SMTP connections.
+
+    ``pool_size`` workers each own one connection and pull messages off a
+    shared queue, sending up to ``messages_per_connection`` per session. Each
+    recipient domain has its own token bucket, and transient failures are
+    retried with jittered exponential backoff.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or SMTPConfig.from_env()
+        self._domain_limiters = {}
+
+    def _limiter_for(self, domain):
+        if domain not in self._domain_limiters:
+            self._domain_limiters[domain] = TokenBucket(max_calls=self.config.domain_rate, time_period=60, name=domain)
+        return self._domain_limiters[domain]
+
+    def _build_message(self, email):
+        message = EmailMessage()
+        message["From"] = self.config.sender
+        message["To"] = email.to
+        message["Subject"] = email.subject
+        message.set_content(email.body)
+        return message
+
+    async def _worker(self, queue, result):
+        connection = _PooledConnection(self.config)
+        try:
+            while True:
+                email = await queue.get()
+                try:
+                    await self._send_with_retries(connection, email, result)
+                finally:
+                    queue.task_done()
+        finally:
+            await run_blocking(connection.close)
+
+    async def _send_with_retries(self, connection, email, result):
+        message = self._build_message(email)
+        for attempt in range(self.config.max_retries + 1):
+            await self._limiter_for(email.domain).acquire_async()
+            try:
+                await run_blocking(connection.send, message)
+                result.sent.append(email.filename)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                if _is_permanent(e) or attempt >= self.config.max_retries:
+                    result.failed[email.filename] = str(e)
+                    return
+                await asyncio.sleep(backoff_delay(attempt, base=1.0, cap=30.0))
+
+    async def dispatch(self, emails, result=None):
+        """
+        Send all ``emails`` and return which were sent and which failed.
+
+        Pass your own ``result`` to still know what was delivered if the
+        dispatch is interrupted.
+        """
+        result = result if result is not None else DispatchResult()
+        queue = asyncio.Queue()
+        for email in emails:
+            queue.put_nowait(email)
+
+        started = time.perf_counter()
+        workers = [
+            asyncio.create_task(self._worker(queue, result))
+            for _ in range(min(self.config.pool_size, max(1, queue.qsize())))
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        result.elapsed = time.perf_counter() - started
+        return result
@@ -0,0 +1,145 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class Job:
+    """One scheduled batch, with the progress counters its function reports."""
+
+    def __init__(self, job_id, key, description):
+        self.id = job_id
+        self.key = key
+        self.description = description
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.total = 0
+        self.processed = 0
+        self.failed = 0
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def report(self, processed, failed, total):
+        """Progress callback handed to the job function."""
+        self.processed = processed
+        self.failed = failed
+        self.total = total
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def throughput(self):
+        """Leads finished per minute."""
+        minutes = self.elapsed / 60
+        return (self.processed + self.failed) / minutes if minutes > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated seconds until the batch finishes, or None before there is a rate to go on."""
+        remaining = self.total - self.processed - self.failed
+        if self.status != RUNNING or remaining <= 0 or not self.throughput:
+            return None
+        return remaining / self.throughput * 60
+
+    def summary(self):
+        line = f"#{self.id} {self.description} [{self.status}] {self.processed}/{self.total} done, {self.failed} failed"
+        if self.started_at is not None:
+            line += f", {self.throughput:.1f} leads/min"
+        if self.eta is not None:
+            line += f", ETA {self.eta / 60:.1f} min"
+        if self.error:
+            line += f" - error: {self.error}"
+        return line
+
+
+class JobScheduler:
+    """
+    Bounded executor for long-running crew batches.
+
+    Only one job per key (lead set) can be queued or running at a time:
+    submitting the same key again returns the job already in flight instead
+    of starting a duplicate run. Jobs beyond ``max_workers`` wait in the queue.
+    """
+
+    def __init__(self, max_workers=1, history=50):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+
+    def submit(self, key, func, description=None, on_done=None):
+        """
+        Schedule ``func(job)`` unless a job with the same key is already active.
+
+        Returns (job, created). ``on_done(job)`` is called from the worker
+        thread when the job finishes, whatever its outcome.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.key == key and job.status in ACTIVE:
+                    return job, False
+
+            job = Job(next(self._ids), key, description or key)
+            self._jobs[job.id] = job
+            self._trim_history()
+            job.future = self._executor.submit(self._run, job, func, on_done)
+            return job, True
+
+    def _run(self, job, func, on_done):
+        if job.cancel_event.is_set():
+            job.status = CANCELLED
+        else:
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = func(job)
+                job.status = CANCELLED if job.cancel_event.is_set() else DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            job.finished_at = time.time()
+
+        if on_done is not None:
+            on_done(job)
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE]
+        for job_id in finished[: max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """
+        Ask a job to stop. Queued jobs never start; running jobs stop picking up
+        new leads and finish the ones already in flight.
+        """
+        job = self.get(job_id)
+        if job is None or job.status not in ACTIVE:
+            return False
+        job.cancel_event.set()
+        if job.status == QUEUED:
+            job.status = CANCELLED
+        return True
@@ -0,0 +1,87 @@
+import csv
+import datetime
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from .lead_store import REQUIRED_FIELDS
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    duplicates: List[str] = field(default_factory=list)
+    rejected: List[Tuple[int, str]] = field(default_factory=list)  # (row number, reason)
+    rows: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        """Rows processed per second."""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _iter_csv(path):
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        # Row 1 is the header
+        for number, row in enumerate(csv.DictReader(f), 2):
+            yield number, row
+
+
+def _iter_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, ValueError(f"invalid JSON: {e.msg}")
+
+
+def iter_rows(path, fmt=None):
+    """Stream (row number, row dict) pairs from a CSV or JSONL file, one row at a time."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt == "csv":
+        return _iter_csv(path)
+    if fmt in ("jsonl", "ndjson", "json"):
+        return _iter_jsonl(path)
+    raise ValueError(f"Unsupported lead file format '{fmt}'. Use .csv or .jsonl")
+
+
+def validate_row(row):
+    """Return (lead, None) for a usable row, or (None, reason) otherwise."""
+    if isinstance(row, Exception):
+        return None, str(row)
+    if not isinstance(row, dict):
+        return None, "row is not an object"
+
+    lead = {str(key).strip(): str(value).strip() for key, value in row.items() if key and value not in (None, "")}
+    missing = [name for name in REQUIRED_FIELDS if not lead.get(name)]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    return lead, None
+
+
+def import_leads(store, path, fmt=None):
+    """Stream-parse a CSV/JSONL file of leads into the store in one transaction, deduping by company."""
+    report = ImportReport()
+    started = time.perf_counter()
+    added_at = datetime.datetime.now().isoformat()
+
+    def valid_leads():
+        for number, row in iter_rows(path, fmt):
+            report.rows += 1
+            lead, reason = validate_row(row)
+            if reason:
+                report.rejected.append((number, reason))
+                continue
+            lead.setdefault("added_at", added_at)
+            yield lead
+
+    report.imported, report.duplicates = store.add_many(valid_leads())
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,299 @@
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+
+# Lead lifecycle, in order
+PENDING = "pending"
+RESEARCHING = "researching"
+WRITTEN = "written"
+SENT = "sent"
+# Off the happy path: failed leads are retried on the next run, dead ones
+# ran out of attempts and wait for someone to requeue them
+FAILED = "failed"
+DEAD = "dead"
+STATUSES = (PENDING, RESEARCHING, WRITTEN, SENT, FAILED, DEAD)
+
+# Statuses a (re)started run picks up. A lead still marked researching was
+# interrupted by a crash and resumes from its last checkpoint
+RESUMABLE = (PENDING, RESEARCHING, FAILED)
+
+DEFAULT_DB_PATH = "leads.db"
+LEGACY_JSON_FILE = "businesses.json"
+
+# Fields every lead needs before a crew can research it
+REQUIRED_FIELDS = ("company", "industry", "business_type", "location")
+
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+
+def company_key(company):
+    """Normalized company name, also used to name the generated email file."""
+    key = re.sub(r"[^\w\s-]", "", company).strip().lower()
+    return re.sub(r"[\s-]+", "_", key)
+
+
+def connect(path):
+    """Open a SQLite connection in WAL mode, shared between threads behind the caller's lock."""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class LeadStore:
+    """
+    SQLite-backed lead repository replacing the read-modify-write businesses.json.
+
+    Adding a lead or moving it along pending -> researching -> written -> sent
+    is a single indexed row write, so the bot and crew workers can use the
+    store at the same time without rewriting anything.
+    """
+
+    def __init__(self, path=None, legacy_json=LEGACY_JSON_FILE):
+        self.path = path or os.getenv("LEADS_DB", DEFAULT_DB_PATH)
+        self._lock = threading.RLock()
+        self._conn = connect(self.path)
+        self._create_schema()
+        if legacy_json:
+            self._import_legacy_json(legacy_json)
+
+    def _create_schema(self):
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS leads (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    company TEXT NOT NULL,
+                    company_key TEXT,
+                    industry TEXT,
+                    business_type TEXT,
+                    location TEXT,
+                    data TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    output_file TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    added_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_leads_company ON leads (company);
+                CREATE INDEX IF NOT EXISTS idx_leads_status ON leads (status);
+                CREATE INDEX IF NOT EXISTS idx_leads_added_at ON leads (added_at);
+                CREATE INDEX IF NOT EXISTS idx_leads_output_file ON leads (output_file);
+
+                CREATE TABLE IF NOT EXISTS lead_checkpoints (
+                    lead_id INTEGER NOT NULL REFERENCES leads (id),
+                    task TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    finished_at TEXT NOT NULL,
+                    PRIMARY KEY (lead_id, task)
+                );
+
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                """
+            )
+            self._add_missing_columns(
+                "leads",
+                {"attempts": "INTEGER NOT NULL DEFAULT 0", "last_error": "TEXT", "company_key": "TEXT"},
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_company_key ON leads (company_key)")
+            rows = self._conn.execute("SELECT id, company FROM leads WHERE company_key IS NULL").fetchall()
+            self._conn.executemany(
+                "UPDATE leads SET company_key = ? WHERE id = ?", [(company_key(row["company"]), row["id"]) for row in rows]
+            )
+
+    def _add_missing_columns(self, table, columns):
+        """Bring databases created by older versions up to the current schema."""
+        existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    def _import_legacy_json(self, json_path):
+        """One-time import of leads still waiting in the old businesses.json."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM store_meta WHERE key = 'legacy_json_imported'").fetchone():
+                return
+            try:
+                with open(json_path, "r") as f:
+                    businesses = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                businesses = []
+
+            self._conn.execute("BEGIN")
+            try:
+                for business in businesses:
+                    self._insert(business)
+                self._conn.execute(
+                    "INSERT INTO store_meta (key, value) VALUES ('legacy_json_imported', ?)", (_now(),)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    _INSERT_SQL = """INSERT INTO leads (company, company_key, industry, business_type, location, data, status, added_at, updated_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+    @staticmethod
+    def _row(lead, now):
+        return (
+            lead["company"],
+            company_key(lead["company"]),
+            lead.get("industry"),
+            lead.get("business_type"),
+            lead.get("location"),
+            json.dumps(lead),
+            PENDING,
+            lead.get("added_at") or now,
+            now,
+        )
+
+    def _insert(self, lead):
+        return self._conn.execute(self._INSERT_SQL, self._row(lead, _now())).lastrowid
+
+    @staticmethod
+    def _to_lead(row):
+        lead = json.loads(row["data"])
+        lead["id"] = row["id"]
+        lead["status"] = row["status"]
+        lead["attempts"] = row["attempts"]
+        if row["last_error"]:
+            lead["last_error"] = row["last_error"]
+        if row["output_file"]:
+            lead["output_file"] = row["output_file"]
+        return lead
+
+    def add(self, lead):
+        """Append a new pending lead and return its id."""
+        with self._lock:
+            return self._insert(lead)
+
+    def add_many(self, leads, batch_size=500):
+        """
+        Insert an iterable of leads in one transaction, skipping companies already in the store.
+
+        Leads are consumed lazily and written in batches, so a large import never
+        needs to be held in memory. Returns (inserted, duplicates) where
+        duplicates lists the skipped company names.
+        """
+        inserted, duplicates = 0, []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                batch = {}
+                for lead in leads:
+                    key = company_key(lead["company"])
+                    if key in batch or self._conn.execute(
+                        "SELECT 1 FROM leads WHERE company_key = ? LIMIT 1", (key,)
+                    ).fetchone():
+                        duplicates.append(lead["company"])
+                        continue
+                    batch[key] = lead
+                    if len(batch) >= batch_size:
+                        inserted += self._insert_batch(batch.values())
+                        batch = {}
+                inserted += self._insert_batch(batch.values())
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return inserted, duplicates
+
+    def _insert_batch(self, leads):
+        now = _now()
+        rows = [self._row(lead, now) for lead in leads]
+        self._conn.executemany(self._INSERT_SQL, rows)
+        return len(rows)
+
+    def get(self, lead_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM leads WHERE id = ?", (lead_id,)).fetchone()
+        return self._to_lead(row) if row else None
+
+    def list(self, statuses=None, offset=0, limit=-1):
+        """Leads in insertion order, optionally limited to the given statuses and to one page."""
+        query = "SELECT * FROM leads"
+        params = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params = tuple(statuses)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id LIMIT ? OFFSET ?", params + (limit, offset)).fetchall()
+        return [self._to_lead(row) for row in rows]
+
+    def count(self, statuses=None):
+        query = "SELECT COUNT(*) FROM leads"
+        params = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params = tuple(statuses)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def set_status(self, lead_id, status, output_file=None):
+        """Move a lead to a new status, optionally recording the generated email file."""
+        if status not in STATUSES:
+            raise ValueError(f"Unknown lead status: {status}")
+        with self._lock:
+            self._conn.execute(
+                "UPDATE leads SET status = ?, output_file = COALESCE(?, output_file), updated_at = ? WHERE id = ?",
+                (status, output_file, _now(), lead_id),
+            )
+
+    def mark_sent(self, output_files):
+        """Move the leads whose emails were sent (by generated file name) to sent."""
+        output_files = list(output_files)
+        if not output_files:
+            return 0
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE leads SET status = ?, updated_at = ? WHERE output_file IN ({', '.join('?' for _ in output_files)})",
+                [SENT, _now(), *output_files],
+            ).rowcount
+
+    def record_failure(self, lead_id, error, max_attempts=3):
+        """Count a failed attempt; the lead becomes failed, or dead once it runs out of attempts."""
+        with self._lock:
+            self._conn.execute(
+                """UPDATE leads SET attempts = attempts + 1, last_error = ?, updated_at = ?,
+                   status = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END
+                   WHERE id = ?""",
+                (str(error), _now(), max_attempts, DEAD, FAILED, lead_id),
+            )
+            return self._conn.execute("SELECT status FROM leads WHERE id = ?", (lead_id,)).fetchone()[0]
+
+    def requeue(self, lead_id=None):
+        """Send a failed/dead lead (or all of them) back to pending with a fresh attempt count."""
+        query = "UPDATE leads SET status = ?, attempts = 0, updated_at = ? WHERE status IN (?, ?)"
+        params = [PENDING, _now(), FAILED, DEAD]
+        if lead_id is not None:
+            query += " AND id = ?"
+            params.append(lead_id)
+        with self._lock:
+            return self._conn.execute(query, params).rowcount
+
+    def save_checkpoint(self, lead_id, task, output):
+        """Persist a finished task's output so a resumed run can skip it."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lead_checkpoints (lead_id, task, output, finished_at) VALUES (?, ?, ?, ?)",
+                (lead_id, task, output, _now()),
+            )
+
+    def checkpoints(self, lead_id):
+        """Finished task outputs for a lead, keyed by task name."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task, output FROM lead_checkpoints WHERE lead_id = ?", (lead_id,)
+            ).fetchall()
+        return {row["task"]: row["output"] for row in rows}
@@ -1,9 +1,16 @@
 #!/usr/bin/env python
 import sys
-import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
-from .crew import SalesPersonalizedEmailCrew
+from .coldleads_index import ColdLeadsIndex, output_filename
+from .crew import CrewFactory, SalesPersonalizedEmailCrew, batch_research_inputs, parse_batch_research
+from .lead_store import DEAD, RESEARCHING, RESUMABLE, WRITTEN, LeadStore, company_key
+from .metrics import TRACER, export_metrics
+from .scraper import PageScraper, lead_urls
+from .training_store import install as install_training_store
 
 # Load environment variables
 load_dotenv()
@@ -14,9 +21,61 @@ load_dotenv()
 # interpolate any tasks and agents information
 
 
-def run():
+# Bookkeeping the lead store adds to each lead, which isn't crew input
+LEAD_STATE_FIELDS = ("id", "status", "output_file", "attempts", "last_error")
+
+OUR_PRODUCT = "beautiful, brand-aligned websites built to impress and convert"
+
+# Agent running each task, for the task spans
+TASK_AGENTS = {"research_sme_task": "sme_researcher", "write_sme_email_task": "sme_email_copywriter"}
+
+
+def research_batches(leads, batch_size):
+    """Split leads into groups of up to ``batch_size`` sharing an industry and location."""
+    groups = {}
+    for lead in leads:
+        key = (lead["industry"].strip().lower(), lead["location"].strip().lower())
+        groups.setdefault(key, []).append(lead)
+    for group in groups.values():
+        for start in range(0, len(group), batch_size):
+            yield group[start:start + batch_size]
+
+
+def run(max_workers=None, cancel_event=None, progress=None, force=False, batch_size=None, crew_factory=None):
     """
     Run the crew.
+
+    Leads are processed by a pool of up to ``max_workers`` crews at once
+    (defaults to the CREW_WORKERS environment variable, or 1). Every crew
+    shares the same rate-limited LLM, so the global call budget holds no
+    matter how many workers are in flight.
+
+    Each finished task is checkpointed in the lead store. A lead interrupted
+    after its research resumes at write_sme_email_task, and a lead that keeps
+    failing is moved to the dead-letter list (after CREW_MAX_ATTEMPTS tries)
+    instead of blocking the rest of the batch.
+
+    Companies that already have a generated email in coldleads are skipped
+    unless ``force`` is set, and duplicate leads for the same company (by
+    normalized name) share a single crew run.
+
+    With ``batch_size`` above 1 (or CREW_BATCH_SIZE), leads from the same
+    industry and location are first researched together, up to that many per
+    agent run. Each lead's share is checkpointed as its research, so the lead
+    then only runs write_sme_email_task. Leads a batch misses (or a failed
+    batch) fall back to the per-lead research. The summary reports the API
+    calls made and leads per call.
+
+    Before any research, the website/reviews pages of the leads that have
+    them are fetched concurrently (see scraper.PageScraper) and handed to the
+    researcher as text, so agents don't wait on serial page loads.
+
+    Setting ``cancel_event`` stops the run from starting any more leads (those
+    already in flight finish). ``progress(processed, failed, total)`` is called
+    after every lead. Crew kickoffs, tasks, tool and LLM calls are traced
+    (see metrics.TRACER) and exported to METRICS_TEXTFILE after every lead.
+    ``crew_factory`` replaces the default CrewFactory (the
+    offline benchmarks pass one wired to a fake LLM and search).
     """
     # inputs = {
     #     "company": "Tea World",
@@ -27,24 +86,135 @@ def run():
     #     "product": "beautiful, brand-aligned websites built to impress and convert",
     # }
 
-    with open("businesses.json", "r") as f:
-        data = json.load(f)
-    
-    while data:
-        inputs = data[0]  # Get the first item
-        inputs["our_product"] = "beautiful, brand-aligned websites built to impress and convert"
-        inputs["product"] = "beautiful, brand-aligned websites built to impress and convert"
-        
-        # Pass the company name to the crew constructor
-        SalesPersonalizedEmailCrew(company_name=inputs["company"]).crew().kickoff(inputs=inputs)
+    if max_workers is None:
+        max_workers = int(os.getenv("CREW_WORKERS", "1"))
+    max_workers = max(1, max_workers)
+    max_attempts = int(os.getenv("CREW_MAX_ATTEMPTS", "3"))
+    if batch_size is None:
+        batch_size = int(os.getenv("CREW_BATCH_SIZE", "1"))
+
+    store = LeadStore()
+    coldleads_index = ColdLeadsIndex()
+    # Config is parsed and tools built once for the whole batch
+    crew_factory = crew_factory or CrewFactory()
+    api_calls_before = getattr(crew_factory.llm, "api_calls", 0)
+    summary = {"processed": 0, "resumed": 0, "skipped": 0, "failed": [], "dead": [], "cancelled": 0}
+
+    # Collapse leads for the same company into one crew run
+    groups = {}
+    for lead in store.list(statuses=RESUMABLE):
+        groups.setdefault(company_key(lead["company"]), []).append(lead)
+
+    leads = []
+    duplicates = {}
+    for group in groups.values():
+        filename = output_filename(group[0]["company"])
+        if not force and coldleads_index.get(filename):
+            # Already generated: don't pay for research again or overwrite it
+            for lead in group:
+                store.set_status(lead["id"], WRITTEN, output_file=filename)
+            summary["skipped"] += len(group)
+            continue
+        leads.append(group[0])
+        duplicates[group[0]["id"]] = group[1:]
+
+    def process(lead):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        store.set_status(lead["id"], RESEARCHING)
+        inputs = {key: value for key, value in lead.items() if key not in LEAD_STATE_FIELDS}
+        inputs["our_product"] = OUR_PRODUCT
+        inputs["product"] = OUR_PRODUCT
+
+        # Tasks run one after another, so each one spans from the previous one's end
+        task_started = [time.perf_counter()]
+
+        def checkpoint(task_name, output):
+            now = time.perf_counter()
+            TRACER.record("task", task_name, (now - task_started[0]) * 1000,
+                          agent=TASK_AGENTS.get(task_name), lead=lead["company"])
+            task_started[0] = now
+            store.save_checkpoint(lead["id"], task_name, output.raw)
+
+        # Bind the company name to this lead's crew
+        email_crew = crew_factory.build(company_name=inputs["company"], task_callback=checkpoint)
+        research = store.checkpoints(lead["id"]).get("research_sme_task")
+        if research is not None:
+            with TRACER.span("crew", "write_only", lead=lead["company"]):
+                email_crew.write_only_crew(research).kickoff(inputs=inputs)
+        else:
+            with TRACER.span("crew", "full", lead=lead["company"]):
+                email_crew.crew(site_context=site_contexts.get(lead["id"])).kickoff(inputs=inputs)
+        # The file may overwrite an older one in place, which a folder rescan wouldn't notice
+        coldleads_index.update_file(email_crew.get_output_filename())
+        for written in [lead] + duplicates[lead["id"]]:
+            store.set_status(written["id"], WRITTEN, output_file=email_crew.get_output_filename())
+        return research is not None and lead["id"] not in batch_researched
+
+    batch_researched = set()
+
+    def research_batch(batch):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        with TRACER.span("crew", "batch_research", leads=len(batch)):
+            output = crew_factory.batch_research_crew().kickoff(inputs=batch_research_inputs(batch, OUR_PRODUCT))
+        research = {company_key(company): text for company, text in parse_batch_research(output).items()}
+        for lead in batch:
+            text = research.get(company_key(lead["company"]))
+            if text:
+                store.save_checkpoint(lead["id"], "research_sme_task", text)
+                batch_researched.add(lead["id"])
+
+    if progress is not None:
+        progress(0, 0, len(leads))
+
+    # Scrape every page for the batch up front, concurrently
+    to_scrape = [
+        lead for lead in leads if lead_urls(lead) and "research_sme_task" not in store.checkpoints(lead["id"])
+    ]
+    site_contexts = {}
+    if to_scrape and not (cancel_event is not None and cancel_event.is_set()):
+        with TRACER.span("stage", "scrape", leads=len(to_scrape)):
+            site_contexts = PageScraper().scrape_leads(to_scrape)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if batch_size > 1:
+            # Leads that already have research (resumed runs) don't need it again
+            unresearched = [lead for lead in leads if "research_sme_task" not in store.checkpoints(lead["id"])]
+            batches = [batch for batch in research_batches(unresearched, batch_size) if len(batch) > 1]
+            for batch, future in [(batch, executor.submit(research_batch, batch)) for batch in batches]:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Batch research failed for {', '.join(lead['company'] for lead in batch)}: {e}")
 
-        # Remove the item from the list
-        data.pop(0)
+        futures = {executor.submit(process, lead): lead for lead in leads}
+        for future in as_completed(futures):
+            lead = futures[future]
+            try:
+                resumed = future.result()
+            except Exception as e:
+                status = store.record_failure(lead["id"], e, max_attempts=max_attempts)
+                print(f"Failed to process lead '{lead['company']}' ({status}): {e}")
+                summary["dead" if status == DEAD else "failed"].append(lead["company"])
+            else:
+                if resumed is None:
+                    # Skipped because the run was cancelled; the lead stays queued
+                    summary["cancelled"] += 1
+                else:
+                    summary["processed"] += 1
+                    summary["resumed"] += int(resumed)
 
-        # Save the updated list back to the file
-        with open("businesses.json", "w") as f:
-            json.dump(data, f, indent=4)
+            if progress is not None:
+                failed = len(summary["failed"]) + len(summary["dead"])
+                progress(summary["processed"], failed, len(leads) - summary["cancelled"])
+            export_metrics()
 
+    api_calls = getattr(crew_factory.llm, "api_calls", 0) - api_calls_before
+    summary["batch_researched"] = len(batch_researched)
+    summary["llm_calls"] = api_calls
+    summary["leads_per_llm_call"] = round(summary["processed"] / api_calls, 3) if api_calls else None
+    return summary
 
 
 def train():
@@ -59,6 +229,8 @@ def train():
         "our_product": "beautiful, brand-aligned websites built to impress and convert",
         "product": "beautiful, brand-aligned websites built to impress and convert",
     }
+    # Training feedback and trained suggestions go to the append-only training store
+    install_training_store()
     try:
         # Pass the company name to the crew constructor
         SalesPersonalizedEmailCrew(company_name=inputs["company"]).crew().train(
@@ -109,7 +281,10 @@ def test():
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "run":
-            run()
+            # run [workers] [--force] [--batch=K]
+            args = [arg for arg in sys.argv[2:] if not arg.startswith("--")]
+            batch = next((int(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--batch=")), None)
+            print(run(int(args[0]) if args else None, force="--force" in sys.argv, batch_size=batch))
         elif sys.argv[1] == "test" and len(sys.argv) > 2:
             test()
         elif sys.argv[1] == "train" and len(sys.argv) > 3:
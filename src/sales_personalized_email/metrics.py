@@ -0,0 +1,209 @@
+import bisect
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import threading
+import time
+
+# Upper bounds (milliseconds) of the latency buckets
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; constant memory however many samples it sees."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+            self.count += 1
+            self.total += value_ms
+            self.max = max(self.max, value_ms)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (the max for the +Inf bucket)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = p / 100 * self.count
+            seen = 0
+            for i, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return float(self.buckets[i]) if i < len(self.buckets) else self.max
+            return self.max
+
+    def snapshot(self):
+        """(bucket bounds, per-bucket counts incl. +Inf, count, total) taken atomically."""
+        with self._lock:
+            return self.buckets, list(self.counts), self.count, self.total
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max, 1),
+        }
+
+
+class HistogramSet:
+    """Histograms created on demand by name, e.g. one per bot command."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value_ms):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+        histogram.observe(value_ms)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._histograms.items())
+
+    def summaries(self):
+        return {name: histogram.summary() for name, histogram in self.items()}
+
+
+# Crew runs last minutes, LLM calls seconds and cached lookups milliseconds
+SPAN_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Tracer:
+    """
+    Timed spans for crew kickoffs, tasks, tool calls and LLM calls.
+
+    Durations are aggregated per "kind:name" in histograms, and numeric span
+    attributes (tokens_in, tokens_out, wait_s, ...) are summed alongside. Spans
+    nest per thread and per asyncio task (the current span is a context
+    variable): a span inherits its parent's ``lead``, and add() annotates
+    the innermost open span, so code deep inside a call (the rate limiter, a
+    retry loop) can report into it without passing it around. Every finished
+    span is also appended as a JSON line to ``log_path`` (by default
+    SPAN_LOG_PATH, read when the span ends so a .env loaded later applies).
+    """
+
+    def __init__(self, log_path=None, buckets=SPAN_BUCKETS_MS):
+        self.log_path = log_path
+        self.durations = HistogramSet(buckets)
+        self._totals = {}
+        self._lock = threading.Lock()
+        self._current = contextvars.ContextVar(f"tracer_span_{id(self)}", default=None)
+
+    @contextlib.contextmanager
+    def span(self, kind, name, **attrs):
+        parent = self._current.get()
+        if parent is not None and "lead" in parent and "lead" not in attrs:
+            attrs["lead"] = parent["lead"]
+        token = self._current.set(attrs)
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self._current.reset(token)
+            self.record(kind, name, (time.perf_counter() - started) * 1000, **attrs)
+
+    def add(self, **values):
+        """Add numeric values to the innermost open span (no-op outside a span)."""
+        current = self._current.get()
+        if current is not None:
+            for key, value in values.items():
+                current[key] = current.get(key, 0) + value
+
+    def record(self, kind, name, duration_ms, **attrs):
+        """Record a finished span measured elsewhere."""
+        key = f"{kind}:{name}"
+        self.durations.observe(key, duration_ms)
+        with self._lock:
+            totals = self._totals.setdefault(key, {"errors": 0})
+            if attrs.get("error"):
+                totals["errors"] += 1
+            for field, value in attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[field] = totals.get(field, 0) + value
+        log_path = self.log_path if self.log_path is not None else os.getenv("SPAN_LOG_PATH")
+        if log_path:
+            line = json.dumps(
+                {"ts": datetime.datetime.now().isoformat(), "kind": kind, "name": name,
+                 "duration_ms": round(duration_ms, 1), **attrs},
+                default=str,
+            )
+            with self._lock, open(log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def summaries(self):
+        """Per "kind:name": latency percentiles plus summed attributes."""
+        with self._lock:
+            totals = {key: dict(value) for key, value in self._totals.items()}
+        return {key: {**summary, **totals.get(key, {})} for key, summary in self.durations.summaries().items()}
+
+    def prometheus(self, prefix="emailcrew_span"):
+        """Aggregates in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_duration_seconds Duration of crew, task, tool and LLM spans.",
+            f"# TYPE {prefix}_duration_seconds histogram",
+        ]
+        for key, histogram in self.durations.items():
+            kind, name = key.split(":", 1)
+            labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+            buckets, counts, count, total = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{prefix}_duration_seconds_sum{{{labels}}} {total / 1000:.6f}")
+            lines.append(f"{prefix}_duration_seconds_count{{{labels}}} {count}")
+
+        with self._lock:
+            totals = sorted((key, dict(value)) for key, value in self._totals.items())
+        fields = sorted({field for _, value in totals for field in value})
+        for field in fields:
+            metric = f"{prefix}_{field[:-2]}_seconds" if field.endswith("_s") else f"{prefix}_{field}"
+            lines.append(f"# TYPE {metric}_total counter")
+            for key, value in totals:
+                if field in value:
+                    kind, name = key.split(":", 1)
+                    lines.append(f'{metric}_total{{kind="{_label(kind)}",name="{_label(name)}"}} {value[field]:g}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Write prometheus() to ``path`` atomically (for node_exporter's textfile collector)."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+
+# Process-wide tracer shared by the crews, tools and the bot
+TRACER = Tracer()
+
+
+def export_metrics():
+    """Write the tracer's aggregates to METRICS_TEXTFILE, if set."""
+    path = os.getenv("METRICS_TEXTFILE")
+    if path:
+        TRACER.write_textfile(path)
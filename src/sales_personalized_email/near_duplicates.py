@@ -0,0 +1,238 @@
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from .coldleads_index import read_lead_file
+from .lead_store import DEFAULT_DB_PATH, connect
+
+# Estimated Jaccard similarity of two emails' word shingles above which they
+# count as the same copy
+DEFAULT_THRESHOLD = 0.8
+SHINGLE_WORDS = 4
+NUM_PERM = 128
+# A bucket this full is one template shared by many emails: its members are
+# paired with the bucket's first member only instead of with each other
+MAX_BUCKET = 200
+
+# Mersenne prime for the (a*x + b) % p hash family; keeps a*x within uint64
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+def shingles(text, company=None, k=SHINGLE_WORDS):
+    """Hashes of the k-word shingles of an email, with the company's own name masked out."""
+    text = text.lower()
+    if company:
+        # "Dear Al Maha Insurance" and "Dear Care Bear Nursery" should read the same
+        text = text.replace(company.lower(), " company ")
+    words = re.findall(r"\w+", text)
+    if len(words) < k:
+        words = words and [" ".join(words)]
+        k = 1
+    return np.unique(
+        np.array(
+            [zlib.crc32(" ".join(words[i : i + k]).encode("utf-8")) for i in range(len(words) - k + 1)],
+            dtype=np.uint64,
+        )
+    ) % _PRIME
+
+
+def lsh_bands(num_perm, threshold):
+    """
+    (bands, rows) splitting a signature for LSH bucketing.
+
+    Two signatures share a bucket with a probability that rises steeply
+    around (1/bands) ** (1/rows); the split whose steep point is closest
+    below ``threshold`` is picked, trading extra candidates (which are
+    checked anyway) for not missing pairs.
+    """
+    splits = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [split for split in splits if (1 / split[0]) ** (1 / split[1]) <= threshold]
+    return max(below, key=lambda split: (1 / split[0]) ** (1 / split[1])) if below else splits[-1]
+
+
+class MinHasher:
+    """MinHash signatures of shingle sets, one vectorized pass per document."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        generator = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = generator.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = generator.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        """Signature of one shingle set as uint32, or None for an empty set."""
+        if not len(hashes):
+            return None
+        values = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % _PRIME
+        return values.min(axis=1).astype(np.uint32)
+
+
+def candidate_pairs(signatures, bands, rows, max_bucket=MAX_BUCKET):
+    """Index pairs (i < j) sharing at least one LSH bucket, as an (n, 2) array."""
+    n = len(signatures)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    # Each band's rows are folded into one 64-bit bucket key; collisions only add candidates
+    multipliers = np.random.default_rng(0).integers(1, 1 << 62, size=rows, dtype=np.uint64)
+    codes = []
+    for band in range(bands):
+        keys = (signatures[:, band * rows : (band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = np.sort(order[start : start + size])
+            if size > max_bucket:
+                first = np.full(size - 1, members[0])
+                pairs = np.stack([first, members[1:]], axis=1)
+            else:
+                i, j = np.triu_indices(size, 1)
+                pairs = np.stack([members[i], members[j]], axis=1)
+            codes.append(pairs[:, 0] * n + pairs[:, 1])
+    if not codes:
+        return np.empty((0, 2), dtype=np.int64)
+    codes = np.unique(np.concatenate(codes))
+    return np.stack([codes // n, codes % n], axis=1)
+
+
+def similar_pairs(signatures, threshold=DEFAULT_THRESHOLD, chunk=100_000):
+    """
+    Pairs of rows whose estimated Jaccard similarity is at least ``threshold``.
+
+    Returns [(i, j, similarity)], most similar first. Only pairs sharing an
+    LSH bucket are compared, so the cost grows with the number of candidate
+    pairs rather than with the square of the number of emails.
+    """
+    if len(signatures) < 2:
+        return []
+    bands, rows = lsh_bands(signatures.shape[1], threshold)
+    candidates = candidate_pairs(signatures, bands, rows)
+    found = []
+    for offset in range(0, len(candidates), chunk):
+        pairs = candidates[offset : offset + chunk]
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        keep = similarity >= threshold
+        found.extend(zip(pairs[keep, 0].tolist(), pairs[keep, 1].tolist(), similarity[keep].tolist()))
+    found.sort(key=lambda pair: pair[2], reverse=True)
+    return found
+
+
+class NearDuplicateIndex:
+    """
+    Near-duplicate detection over the email_body of the coldleads files.
+
+    Each file's MinHash signature is kept in the lead database next to the
+    coldleads manifest and recomputed only when the file's mtime or size
+    changes, so a check mostly loads stored signatures and buckets them.
+    """
+
+    def __init__(self, coldleads_index, path=None, threshold=None, num_perm=NUM_PERM):
+        self.index = coldleads_index
+        self.threshold = threshold or float(os.getenv("DEDUP_THRESHOLD", DEFAULT_THRESHOLD))
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.RLock()
+        self._conn = connect(path or os.getenv("LEADS_DB", DEFAULT_DB_PATH))
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS coldleads_minhash (
+                filename TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                signature BLOB
+            );
+            """
+        )
+
+    def _signature_of(self, filename, company):
+        try:
+            fields = read_lead_file(os.path.join(self.index.folder, filename))
+        except (OSError, ValueError):
+            return None
+        signature = self.hasher.signature(shingles(fields.get("email_body") or "", company))
+        return signature.tobytes() if signature is not None else None
+
+    def refresh(self):
+        """Compute signatures for new or changed files and forget removed ones."""
+        self.index.refresh()
+        with self._lock:
+            stale = self._conn.execute(
+                """SELECT m.filename, m.company, m.mtime, m.size FROM coldleads_manifest m
+                   LEFT JOIN coldleads_minhash h ON h.filename = m.filename
+                   WHERE h.filename IS NULL OR h.mtime != m.mtime OR h.size != m.size"""
+            ).fetchall()
+            rows = [
+                (row["filename"], row["mtime"], row["size"], self._signature_of(row["filename"], row["company"]))
+                for row in stale
+            ]
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    """INSERT INTO coldleads_minhash (filename, mtime, size, signature) VALUES (?, ?, ?, ?)
+                       ON CONFLICT (filename) DO UPDATE SET
+                           mtime = excluded.mtime, size = excluded.size, signature = excluded.signature""",
+                    rows,
+                )
+                self._conn.execute(
+                    "DELETE FROM coldleads_minhash WHERE filename NOT IN (SELECT filename FROM coldleads_manifest)"
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def signatures(self, filenames=None):
+        """(filenames, signature matrix) for the given files (all by default), in manifest order."""
+        self.refresh()
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT h.filename, h.signature FROM coldleads_minhash h
+                   JOIN coldleads_manifest m ON m.filename = h.filename
+                   WHERE h.signature IS NOT NULL ORDER BY m.seq"""
+            ).fetchall()
+        if filenames is not None:
+            wanted = set(filenames)
+            rows = [row for row in rows if row["filename"] in wanted]
+        names = [row["filename"] for row in rows]
+        matrix = np.frombuffer(b"".join(row["signature"] for row in rows), dtype=np.uint32)
+        return names, matrix.reshape(len(names), self.hasher.num_perm)
+
+    def pairs(self, filenames=None, threshold=None):
+        """Near-duplicate file pairs [(first, second, similarity)], most similar first."""
+        names, matrix = self.signatures(filenames)
+        return [
+            (names[i], names[j], similarity)
+            for i, j, similarity in similar_pairs(matrix, threshold or self.threshold)
+        ]
+
+    def held_back(self, candidates, staged):
+        """
+        Which of ``candidates`` to keep out of the staging area.
+
+        Going through candidates in manifest order, a file is held back when
+        it nearly duplicates an already staged file or a candidate let
+        through before it. Returns {filename: (the file it duplicates, similarity)}.
+        """
+        candidates = list(candidates)
+        if not candidates:
+            return {}
+        twins = {}
+        for first, second, similarity in self.pairs(set(candidates) | set(staged)):
+            twins.setdefault(first, []).append((second, similarity))
+            twins.setdefault(second, []).append((first, similarity))
+        accepted = set(staged)
+        held = {}
+        for filename in candidates:
+            twin = max(
+                ((other, similarity) for other, similarity in twins.get(filename, ()) if other in accepted),
+                key=lambda pair: pair[1],
+                default=None,
+            )
+            if twin:
+                held[filename] = twin
+            else:
+                accepted.add(filename)
+        return held
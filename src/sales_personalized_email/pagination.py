@@ -0,0 +1,140 @@
+import math
+import re
+
+import discord
+
+from .storage import run_blocking
+
+PAGE_SIZE = 20
+# Embed descriptions can hold 4096 characters; one page of lines stays well under it
+LINE_LIMIT = 180
+CHUNK_LIMIT = 3900
+# Plain messages are rejected past 2000 characters
+MESSAGE_LIMIT = 2000
+
+
+def parse_page(arg, default=1):
+    """Page number from a command argument, accepting ``3`` or ``page=3``."""
+    if arg is None:
+        return default
+    match = re.fullmatch(r"(?:page=)?(\d+)", str(arg).strip())
+    if not match:
+        raise ValueError(f"Invalid page '{arg}'. Use page=N")
+    return int(match.group(1))
+
+
+def chunk_text(text, limit=CHUNK_LIMIT):
+    """Yield pieces of ``text`` of at most ``limit`` characters, split on line breaks where possible."""
+    chunk = []
+    size = 0
+    for line in text.splitlines():
+        while len(line) > limit:
+            if chunk:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+            yield line[:limit]
+            line = line[limit:]
+        if size + len(line) + 1 > limit and chunk:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield "\n".join(chunk)
+
+
+class Paginator:
+    """
+    Renders one page of a listing at a time as an embed.
+
+    ``fetch(offset, limit)`` returns the items for a page (typically a
+    LIMIT/OFFSET query) and ``format_item(number, item)`` turns each into a
+    line, so only the page being shown is ever loaded or formatted. Lines
+    longer than ``max_line`` are cut short; pass None for items that are
+    whole blocks of text already sized to fit (see chunk_text).
+    """
+
+    def __init__(self, title, total, fetch, format_item, page_size=PAGE_SIZE, header=None, max_line=LINE_LIMIT):
+        self.title = title
+        self.total = total
+        self.fetch = fetch
+        self.format_item = format_item
+        self.page_size = page_size
+        self.header = header
+        self.max_line = max_line
+
+    @property
+    def page_count(self):
+        return max(1, math.ceil(self.total / self.page_size))
+
+    def clamp(self, page):
+        return min(max(page, 1), self.page_count)
+
+    def render(self, page):
+        """Build the embed for ``page`` (1-based). Blocking: fetch may hit the database."""
+        offset = (page - 1) * self.page_size
+        lines = []
+        for number, item in enumerate(self.fetch(offset, self.page_size), offset + 1):
+            line = self.format_item(number, item)
+            if self.max_line is not None and len(line) > self.max_line:
+                line = line[: self.max_line - 3] + "..."
+            lines.append(line)
+        description = "\n".join(lines)
+        if self.header:
+            description = f"{self.header}\n\n{description}"
+        embed = discord.Embed(title=self.title, description=description[:4096])
+        embed.set_footer(text=f"Page {page}/{self.page_count}")
+        return embed
+
+
+class PageView(discord.ui.View):
+    """Prev/next buttons for a Paginator; only the user who ran the command can turn pages."""
+
+    def __init__(self, paginator, page, author_id, timeout=180):
+        super().__init__(timeout=timeout)
+        self.paginator = paginator
+        self.page = page
+        self.author_id = author_id
+        self.message = None
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page <= 1
+        self.next_page.disabled = self.page >= self.paginator.page_count
+
+    async def _show(self, interaction, page):
+        self.page = self.paginator.clamp(page)
+        embed = await run_blocking(self.paginator.render, self.page)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, self.page + 1)
+
+    async def interaction_check(self, interaction):
+        return interaction.user.id == self.author_id
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+
+async def send_paginated(ctx, paginator, page=1):
+    """Send ``page`` of a listing, with buttons when there is more than one page."""
+    page = paginator.clamp(page)
+    embed = await run_blocking(paginator.render, page)
+    if paginator.page_count <= 1:
+        await ctx.send(embed=embed)
+        return
+    view = PageView(paginator, page, ctx.author.id)
+    view.message = await ctx.send(embed=embed, view=view)
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by every caller of the same budget.
+
+    Each acquire reserves a token under a lock in O(1) and then sleeps outside
+    the lock, so waiting callers queue up in order without holding each other
+    up. When ``state_path`` is given the bucket state lives in a small SQLite
+    file, letting several processes on one machine respect a single budget.
+
+    A full bucket lets ``capacity`` calls through at once (one by default),
+    and the refill rate leaves room for that burst: any ``time_period``
+    window admits at most ``max_calls`` calls, as the old sliding window did.
+    """
+
+    def __init__(self, max_calls, time_period, capacity=None, state_path=None, name="default"):
+        self.max_calls = max_calls
+        self.time_period = time_period
+        self.capacity = min(capacity or 1, max_calls)
+        # tokens per second; a window holds the burst plus what refills in it
+        self.refill_rate = max(max_calls - self.capacity, 1) / time_period
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.capacity)
+        self._updated = time.time()
+
+        self._conn = None
+        if state_path:
+            self._conn = sqlite3.connect(state_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+        # Wait-time reporting
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _take(self, tokens, updated, now):
+        """Refill the bucket up to now and take one token, returning the new state and the wait."""
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate) - 1
+        # A negative balance means the token is reserved in the future
+        wait = -tokens / self.refill_rate if tokens < 0 else 0.0
+        return tokens, now, wait
+
+    def _reserve(self):
+        """Reserve one token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.time()
+            if self._conn is None:
+                self._tokens, self._updated, wait = self._take(self._tokens, self._updated, now)
+            else:
+                wait = self._reserve_shared(now)
+
+            self.acquired += 1
+            if wait > 0:
+                self.waited += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def _reserve_shared(self, now):
+        # BEGIN IMMEDIATE takes the write lock up front so two processes can't
+        # both read the same balance
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT tokens, updated FROM token_buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens, updated = row if row else (float(self.capacity), now)
+            tokens, updated, wait = self._take(tokens, updated, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, updated),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def estimated_wait(self):
+        """How long a caller acquiring right now would wait, without reserving anything."""
+        with self._lock:
+            now = time.time()
+            if self._conn is None:
+                tokens, updated = self._tokens, self._updated
+            else:
+                row = self._conn.execute("SELECT tokens, updated FROM token_buckets WHERE name = ?", (self.name,)).fetchone()
+                tokens, updated = row if row else (float(self.capacity), now)
+            return self._take(tokens, updated, now)[2]
+
+    def acquire(self):
+        """Block until a token is available. Returns the number of seconds waited."""
+        wait = self._reserve()
+        if wait > 0:
+            print(f"Rate limit reached. Waiting {wait:.2f} seconds...")
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        """Async variant of acquire() that sleeps without blocking the event loop."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def __call__(self, func):
+        def wrapper(*args, **kwargs):
+            self.acquire()
+            return func(*args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        """Summary of how many calls went through and how long they waited."""
+        return {
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "total_wait": round(self.total_wait, 3),
+            "avg_wait": round(self.total_wait / self.waited, 3) if self.waited else 0.0,
+            "max_wait": round(self.max_wait, 3),
+        }
+
+
+# Kept so existing imports of crew.RateLimiter keep working
+RateLimiter = TokenBucket
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(name, max_calls, time_period):
+    """
+    Return the bucket registered under ``name``, creating it on first use.
+
+    Buckets are backed by RATE_LIMIT_STATE when set, so all local processes share them.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucket(
+                max_calls=max_calls,
+                time_period=time_period,
+                state_path=os.getenv("RATE_LIMIT_STATE"),
+                name=name,
+            )
+        return _limiters[name]
+
+
+def key_fingerprint(api_key):
+    """Short stable id for an API key, safe to log and to use as a bucket name."""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+
+# What survives of a throttling error once it has been wrapped in a generic
+# one: the exception name, Gemini's status name or a 429 given as a status
+# code ("Error code: 429", '"code": 429', "HTTP 429"), not just any "429"
+_RATE_LIMIT_MESSAGE = re.compile(
+    r"RateLimitError|RESOURCE_EXHAUSTED|Too Many Requests|\b(?:status|code|error|http)\W{0,3}429\b",
+    re.IGNORECASE,
+)
+
+
+def is_rate_limit_error(error):
+    """Whether an exception raised by the LLM client is server-side throttling (HTTP 429)."""
+    if type(error).__name__ == "RateLimitError":
+        return True
+    response = getattr(error, "response", None)
+    statuses = (getattr(error, "status_code", None), getattr(error, "code", None), getattr(response, "status_code", None))
+    if 429 in statuses:
+        return True
+    return _RATE_LIMIT_MESSAGE.search(str(error)) is not None
+
+
+def retry_after_seconds(error):
+    """Extract the server's requested delay from a Retry-After header or a Gemini retryDelay, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+
+    match = re.search(r'retry[_ ]?delay["\']?\s*[:=]\s*["\']?(\d+(?:\.\d+)?)s', str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt, retry_after=None, base=2.0, cap=60.0):
+    """Exponential backoff with full jitter, never shorter than what the server asked for."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,110 @@
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+# Heading keywords that identify each part of research_sme_task's profile
+SECTION_KEYWORDS = {
+    "achievement": ("achiev", "accomplish", "award", "complim"),
+    "challenges": ("challenge", "negative", "review", "problem"),
+    "needs": ("need", "pain"),
+    "trends": ("trend",),
+}
+DEFAULT_TOKEN_BUDGET = 200
+
+_HEADING = re.compile(r"^\s*(?:#+\s*|\*\*)?(?:\d+\s*[.):]|#+)\s*(.*)$")
+_BULLET = re.compile(r"^\s*(?:[*\-•]|\d+[.)])\s+")
+
+
+def _clean(text):
+    text = re.sub(r"[*_`#]+", "", text)
+    return re.sub(r"\s+", " ", text).strip(" :-")
+
+
+def _first_sentence(text):
+    return re.split(r"(?<=[.!?])\s+", text, maxsplit=1)[0]
+
+
+def _section_name(heading):
+    heading = heading.lower()
+    for name, keywords in SECTION_KEYWORDS.items():
+        if any(keyword in heading for keyword in keywords):
+            return name
+    return None
+
+
+def split_sections(research):
+    """Group the items of a numbered research profile by section ({name: [item, ...]})."""
+    sections = {}
+    current = None
+    for line in research.splitlines():
+        if not line.strip() or line.strip().startswith("```"):
+            continue
+        heading = _HEADING.match(line)
+        # A numbered line counts as a heading only if it isn't indented like a list item
+        if heading and not line.startswith(("  ", "\t")):
+            current = _section_name(heading.group(1))
+            # "1. One great achievement: won X" carries its content on the heading line
+            _, _, rest = heading.group(1).partition(":")
+            if current and _clean(rest):
+                sections.setdefault(current, []).append(_clean(rest))
+            continue
+        if current:
+            item = _clean(_BULLET.sub("", line))
+            if item:
+                sections.setdefault(current, []).append(item)
+    return sections
+
+
+@dataclass
+class ResearchBrief:
+    achievement: str = ""
+    pain_points: List[str] = field(default_factory=list)
+    trend: str = ""
+
+    def as_text(self):
+        lines = []
+        if self.achievement:
+            lines.append(f"Achievement to compliment: {self.achievement}")
+        for pain_point in self.pain_points:
+            lines.append(f"Pain point: {pain_point}")
+        if self.trend:
+            lines.append(f"Industry trend: {self.trend}")
+        return "\n".join(lines)
+
+
+def build_brief(research, max_pain_points=2):
+    """Pick one achievement, up to ``max_pain_points`` pain points and one trend out of a research profile."""
+    sections = split_sections(research)
+    pain_points = (sections.get("challenges", []) + sections.get("needs", []))[:max_pain_points]
+    return ResearchBrief(
+        achievement=_first_sentence(sections["achievement"][0]) if sections.get("achievement") else "",
+        pain_points=[_first_sentence(point) for point in pain_points],
+        trend=_first_sentence(sections["trends"][0]) if sections.get("trends") else "",
+    )
+
+
+def _approx_tokens(text):
+    return len(text) // 4
+
+
+def compact_research(research, token_budget=DEFAULT_TOKEN_BUDGET, count_tokens=_approx_tokens):
+    """
+    Turn a research profile into a brief of at most ``token_budget`` tokens.
+
+    Returns (brief text, tokens before, tokens after). When no sections can be
+    recognised the research itself is cut to the budget instead.
+    """
+    before = count_tokens(research)
+    brief = build_brief(research)
+    text = brief.as_text()
+    if not text:
+        text = _clean(research)
+    # Drop the second pain point before cutting anything mid-sentence
+    if count_tokens(text) > token_budget and len(brief.pain_points) > 1:
+        brief.pain_points = brief.pain_points[:1]
+        text = brief.as_text()
+    while text and count_tokens(text) > token_budget:
+        cut = text[: int(len(text) * token_budget / count_tokens(text) * 0.95)]
+        text = cut.rsplit(" ", 1)[0] if " " in cut else cut
+    after = count_tokens(text)
+    return text, before, after
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .cache import ResponseCache
+from .metrics import TRACER
+
+# Lead fields holding pages worth reading before research
+URL_FIELDS = ("website", "reviews")
+
+
+@dataclass
+class ScrapeConfig:
+    concurrency: int = 10  # pages in flight across all hosts
+    per_host: int = 2  # pages in flight per host, to stay polite
+    timeout: float = 15.0  # seconds per page, connect to last byte
+    max_bytes: int = 1_000_000  # the rest of a larger page is not downloaded
+    max_chars: int = 4000  # extracted text kept per page
+    user_agent: str = "Mozilla/5.0 (compatible; SimplyDebugResearch/1.0)"
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            concurrency=int(os.getenv("SCRAPE_CONCURRENCY", "10")),
+            per_host=int(os.getenv("SCRAPE_PER_HOST", "2")),
+            timeout=float(os.getenv("SCRAPE_TIMEOUT", "15")),
+            max_bytes=int(os.getenv("SCRAPE_MAX_BYTES", "1000000")),
+            max_chars=int(os.getenv("SCRAPE_MAX_CHARS", "4000")),
+        )
+
+
+class _TextExtractor(HTMLParser):
+    # Content of these tags never reads as page text
+    SKIP = {"script", "style", "noscript", "svg", "template", "head"}
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.title = None
+        self._skipping = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag in self.SKIP:
+            self._skipping += 1
+        if tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+        if tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title = (self.title or "") + data
+        elif not self._skipping:
+            self.parts.append(data)
+
+
+def extract_text(html):
+    """Visible text of an HTML page, one line per block, with the title first."""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    lines = (re.sub(r"\s+", " ", line).strip() for line in "".join(parser.parts).splitlines())
+    text = "\n".join(line for line in lines if line)
+    title = re.sub(r"\s+", " ", parser.title or "").strip()
+    return f"{title}\n{text}" if title else text
+
+
+def lead_urls(lead):
+    """http(s) URLs from a lead's website/reviews fields (comma or whitespace separated)."""
+    urls = []
+    for field in URL_FIELDS:
+        for url in re.split(r"[\s,]+", str(lead.get(field) or "")):
+            if not url:
+                continue
+            if not urlparse(url).scheme:
+                url = f"https://{url}"
+            if urlparse(url).scheme in ("http", "https") and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def scrape_cache():
+    """Extracted pages persisted at SCRAPE_CACHE_PATH (defaults to scrape_cache.db)."""
+    return ResponseCache(
+        path=os.getenv("SCRAPE_CACHE_PATH", "scrape_cache.db"),
+        namespace="scrape",
+        ttl=float(os.getenv("SCRAPE_CACHE_TTL", 30 * 24 * 3600)),
+    )
+
+
+class PageScraper:
+    """
+    Fetches pages concurrently over one pooled aiohttp session and keeps only their text.
+
+    Pages in flight are capped overall and per host, each request has a
+    timeout (counted once it holds its slot, so queueing never times it out)
+    and bodies are read only up to ``max_bytes``. Extracted text is
+    cached by URL with the page's ETag/Last-Modified; a cached page is
+    revalidated with a conditional request and reused on 304 Not Modified.
+    """
+
+    def __init__(self, config=None, cache=None):
+        self.config = config or ScrapeConfig.from_env()
+        self.cache = cache if cache is not None else scrape_cache()
+
+    async def _read_capped(self, response):
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.config.max_bytes:
+                break
+        body = b"".join(chunks)[: self.config.max_bytes]
+        return body.decode(response.charset or "utf-8", errors="replace")
+
+    async def _fetch(self, session, url):
+        cached = self.cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        if not headers:
+            # Nothing to revalidate with: the cached copy is used as is until it expires
+            cached_text = cached.get("text") if cached else None
+            if cached_text is not None:
+                TRACER.add(cache_hits=1)
+                return cached_text
+
+        try:
+            async with session.get(url, headers=headers, allow_redirects=True) as response:
+                if response.status == 304 and cached:
+                    TRACER.add(cache_hits=1)
+                    return cached["text"]
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "")
+                if "html" not in content_type and not content_type.startswith("text/"):
+                    raise ValueError(f"not a text page ({content_type or 'no content type'})")
+                body = await self._read_capped(response)
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # A stale copy beats no context when the site is down
+            if cached:
+                return cached["text"]
+            raise
+
+        TRACER.add(bytes=len(body))
+        text = extract_text(body) if "html" in content_type else body
+        text = text[: self.config.max_chars]
+        self.cache.set(url, {"text": text, "etag": etag, "last_modified": last_modified})
+        return text
+
+    async def _fetch_limited(self, session, url, overall, per_host):
+        host = urlparse(url).netloc
+        async with overall, per_host[host]:
+            with TRACER.span("scrape", host):
+                return await self._fetch(session, url)
+
+    async def scrape(self, urls):
+        """Fetch ``urls`` concurrently. Returns {url: text or None}; errors are printed, not raised."""
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        overall = asyncio.Semaphore(self.config.concurrency)
+        per_host = defaultdict(lambda: asyncio.Semaphore(self.config.per_host))
+        connector = aiohttp.TCPConnector(limit=self.config.concurrency, limit_per_host=self.config.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.config.timeout)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers={"User-Agent": self.config.user_agent}
+        ) as session:
+            results = await asyncio.gather(
+                *(self._fetch_limited(session, url, overall, per_host) for url in urls), return_exceptions=True
+            )
+
+        pages = {}
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                print(f"Could not scrape {url}: {type(result).__name__}: {result}")
+                result = None
+            pages[url] = result
+        return pages
+
+    def scrape_leads(self, leads):
+        """
+        Blocking: fetch every lead's pages in one concurrent batch.
+
+        Returns {lead id: context text} for leads with at least one readable page.
+        """
+        urls_by_lead = {lead["id"]: lead_urls(lead) for lead in leads}
+        pages = asyncio.run(self.scrape([url for urls in urls_by_lead.values() for url in urls]))
+        contexts = {}
+        for lead_id, urls in urls_by_lead.items():
+            sections = [f"From {url}:\n{pages[url]}" for url in urls if pages.get(url)]
+            if sections:
+                contexts[lead_id] = "\n\n".join(sections)
+        return contexts
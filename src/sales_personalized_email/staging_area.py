@@ -0,0 +1,197 @@
+import datetime
+import os
+import threading
+import uuid
+
+from .lead_store import DEFAULT_DB_PATH, connect
+
+# A commit claims the files it is sending; a claim older than this is assumed
+# to belong to a bot that died mid-commit and can be taken over
+STALE_CLAIM_SECONDS = 3600
+
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+
+class StagingArea:
+    """
+    Durable staging area for coldleads files, shared by every bot instance
+    using the same lead database.
+
+    Stage, unstage and commit each run in one transaction. A commit first
+    claims the staged files, so two bots committing at once never send the
+    same email twice; finish_commit() then drops what was sent and releases
+    the rest. Name patterns are resolved through the coldleads index.
+
+    With a NearDuplicateIndex, staging holds back files whose email nearly
+    duplicates one already staged (or staged earlier in the same call), so
+    one send never carries the same copy twice.
+    """
+
+    def __init__(self, coldleads_index, path=None, duplicates=None):
+        self.index = coldleads_index
+        self.duplicates = duplicates
+        self._lock = threading.RLock()
+        self._conn = connect(path or os.getenv("LEADS_DB", DEFAULT_DB_PATH))
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS staged_files (
+                filename TEXT PRIMARY KEY,
+                staged_at TEXT NOT NULL,
+                commit_id TEXT,
+                claimed_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_staged_files_commit_id ON staged_files (commit_id);
+            """
+        )
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _held_back(self, candidates, allow_duplicates):
+        """Near-duplicates among ``candidates`` to leave unstaged: {filename: (twin, similarity)}."""
+        if self.duplicates is None or allow_duplicates:
+            return {}
+        with self._lock:
+            staged = {row["filename"] for row in self._conn.execute("SELECT filename FROM staged_files")}
+        return self.duplicates.held_back([f for f in candidates if f not in staged], staged)
+
+    def stage_all(self, allow_duplicates=False):
+        """Stage every indexed file. Returns (number newly staged, {held back file: (twin, similarity)})."""
+        self.index.refresh()
+        now = _now()
+        held = self._held_back(self.index.filenames(), allow_duplicates)
+
+        def work():
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS held_back (filename TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM held_back")
+            self._conn.executemany("INSERT INTO held_back (filename) VALUES (?)", [(f,) for f in held])
+            return self._conn.execute(
+                """INSERT OR IGNORE INTO staged_files (filename, staged_at)
+                   SELECT filename, ? FROM coldleads_manifest WHERE filename NOT IN (SELECT filename FROM held_back)""",
+                (now,),
+            ).rowcount
+
+        return self._transaction(work), held
+
+    def stage(self, patterns, allow_duplicates=False):
+        """
+        Stage files matching each pattern: the file with exactly that name,
+        or else every file whose name contains it.
+
+        Returns ({pattern: staged filenames}, [patterns with no match],
+        {held back file: (twin, similarity)}).
+        """
+        now = _now()
+        matches, not_found = {}, []
+        for pattern in patterns:
+            found = self.index.find(pattern)
+            # An exact name stages just that file; substring matches are for patterns naming no file
+            if found and found[0] == pattern:
+                found = found[:1]
+            if found:
+                matches[pattern] = found
+            else:
+                not_found.append(pattern)
+        held = self._held_back(dict.fromkeys(f for found in matches.values() for f in found), allow_duplicates)
+        matches = {pattern: [f for f in found if f not in held] for pattern, found in matches.items()}
+
+        def work():
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO staged_files (filename, staged_at) VALUES (?, ?)",
+                [(filename, now) for found in matches.values() for filename in found],
+            )
+
+        self._transaction(work)
+        return matches, not_found, held
+
+    def unstage_all(self):
+        return self._transaction(lambda: self._conn.execute("DELETE FROM staged_files WHERE commit_id IS NULL").rowcount)
+
+    def unstage(self, patterns):
+        """
+        Unstage files matching each pattern, like stage() does. Returns
+        ({pattern: filenames removed}, [patterns with no match]).
+
+        Patterns are matched against the staged names themselves, so a file
+        deleted or renamed in coldleads since it was staged can still be unstaged.
+        """
+
+        def work():
+            matches, not_found = {}, []
+            for pattern in patterns:
+                staged = [
+                    row["filename"]
+                    for row in self._conn.execute(
+                        "SELECT filename FROM staged_files WHERE filename = ? AND commit_id IS NULL", (pattern,)
+                    )
+                ] or [
+                    row["filename"]
+                    for row in self._conn.execute(
+                        """SELECT filename FROM staged_files
+                           WHERE filename LIKE ? ESCAPE '\\' AND commit_id IS NULL ORDER BY filename""",
+                        ("%" + pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",),
+                    )
+                ]
+                if not staged:
+                    not_found.append(pattern)
+                    continue
+                matches[pattern] = staged
+                self._conn.executemany("DELETE FROM staged_files WHERE filename = ?", [(f,) for f in staged])
+            return matches, not_found
+
+        return self._transaction(work)
+
+    def list(self, offset=0, limit=-1):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename FROM staged_files ORDER BY filename LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [row["filename"] for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM staged_files").fetchone()[0]
+
+    def claim_for_commit(self):
+        """Claim all staged files for a commit. Returns (commit_id, filenames)."""
+        commit_id = uuid.uuid4().hex
+        now = datetime.datetime.now()
+        stale_before = (now - datetime.timedelta(seconds=STALE_CLAIM_SECONDS)).isoformat()
+
+        def work():
+            self._conn.execute(
+                """UPDATE staged_files SET commit_id = ?, claimed_at = ?
+                   WHERE commit_id IS NULL OR claimed_at < ?""",
+                (commit_id, now.isoformat(), stale_before),
+            )
+            rows = self._conn.execute(
+                "SELECT filename FROM staged_files WHERE commit_id = ? ORDER BY filename", (commit_id,)
+            ).fetchall()
+            return [row["filename"] for row in rows]
+
+        return commit_id, self._transaction(work)
+
+    def finish_commit(self, commit_id, committed):
+        """Remove the committed files from the staging area and release the rest of the claim."""
+        committed = list(committed)
+
+        def work():
+            self._conn.executemany(
+                "DELETE FROM staged_files WHERE filename = ? AND commit_id = ?",
+                [(filename, commit_id) for filename in committed],
+            )
+            self._conn.execute(
+                "UPDATE staged_files SET commit_id = NULL, claimed_at = NULL WHERE commit_id = ?", (commit_id,)
+            )
+
+        self._transaction(work)
@@ -0,0 +1,87 @@
+"""
+Import-time breakdown for the bot and the crew stack.
+
+Imports each module in a fresh interpreter under ``python -X importtime``
+and prints the slowest imports by cumulative time, plus the wall time and
+peak memory of the whole import:
+
+    python -m sales_personalized_email.startup_report
+    python -m sales_personalized_email.startup_report discord_bot --top 30
+"""
+import argparse
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ("discord_bot", "sales_personalized_email.crew")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(output):
+    """Parse ``-X importtime`` stderr into (module, self_us, cumulative_us, depth) tuples."""
+    entries = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def measure_import(module):
+    """Import ``module`` in a child interpreter; returns (entries, wall seconds, peak RSS in MB)."""
+    started = time.perf_counter()
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # The child should resolve modules the same way this process does
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.getcwd()] + [path for path in sys.path if path]))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"importing {module} failed:\n" + "\n".join(errors[-10:]))
+    # ru_maxrss is the largest child so far (KB on Linux); only meaningful if this one grew it
+    peak_rss = max(before, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    return parse_importtime(completed.stderr), elapsed, peak_rss
+
+
+def format_report(module, entries, elapsed, peak_rss, top=20):
+    total_us = sum(cumulative for _, _, cumulative, depth in entries if depth == 0)
+    lines = [
+        f"{module}: {elapsed:.2f}s wall, {total_us / 1e6:.2f}s in imports, "
+        f"{len(entries)} modules, peak RSS {peak_rss:.0f} MB",
+        f"  {'cumulative':>10}  {'self':>8}  module",
+    ]
+    # Top-level packages only, so one slow package doesn't fill the list with its submodules
+    heaviest = sorted((e for e in entries if "." not in e[0] or e[3] == 0), key=lambda e: e[2], reverse=True)
+    for name, self_us, cumulative_us, _ in heaviest[:top]:
+        lines.append(f"  {cumulative_us / 1000:>8.1f}ms  {self_us / 1000:>6.1f}ms  {name}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=20, help="number of imports to show per module")
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        try:
+            entries, elapsed, peak_rss = measure_import(module)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            continue
+        print(format_report(module, entries, elapsed, peak_rss, args.top))
+        print()
+
+
+if __name__ == "__main__":
+    main()
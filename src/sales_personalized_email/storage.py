@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import json
+import os
+import tempfile
+import threading
+
+# One lock per file path, shared by the bot's executor threads and crew worker
+# threads, so a read-modify-write on a lead file never interleaves with another
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def file_lock(path):
+    """The process-wide lock guarding ``path``."""
+    key = os.path.abspath(path)
+    with _file_locks_guard:
+        if key not in _file_locks:
+            _file_locks[key] = threading.Lock()
+        return _file_locks[key]
+
+
+def _write_json_unlocked(path, data):
+    # Write to a temp file and swap it in, so readers never see a half-written file
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_json(path):
+    with file_lock(path):
+        with open(path, "r") as f:
+            return json.load(f)
+
+
+def write_json(path, data):
+    with file_lock(path):
+        _write_json_unlocked(path, data)
+
+
+def update_json(path, update, default=None):
+    """
+    Read-modify-write a JSON file under its lock.
+
+    ``update`` receives the current data (or ``default`` when the file doesn't
+    exist yet) and returns the data to write back.
+    """
+    with file_lock(path):
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            if default is None:
+                raise
+            data = default
+        data = update(data)
+        _write_json_unlocked(path, data)
+        return data
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run blocking file/database work in the default executor instead of on the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def read_json_async(path):
+    return await run_blocking(read_json, path)
+
+
+async def write_json_async(path, data):
+    return await run_blocking(write_json, path, data)
+
+
+async def update_json_async(path, update, default=None):
+    return await run_blocking(update_json, path, update, default)
@@ -0,0 +1,94 @@
+import os
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Type
+
+from crewai.tools import BaseTool
+from crewai_tools import SerperDevTool
+from pydantic import BaseModel, Field
+
+from ..cache import ResponseCache, cache_key
+from ..metrics import TRACER
+
+
+class CachedSearchToolSchema(BaseModel):
+    search_query: str = Field(..., description="Mandatory search query you want to use to search the internet")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so near-identical queries share an entry."""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+# Searches currently running, keyed by cache key, so concurrent crews asking
+# the same thing wait for one call instead of each making their own
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def search_cache():
+    """Process-wide search cache, persisted at SEARCH_CACHE_PATH (defaults to search_cache.db)."""
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = ResponseCache(
+                path=os.getenv("SEARCH_CACHE_PATH", "search_cache.db"),
+                namespace="serper",
+                ttl=float(os.getenv("SEARCH_CACHE_TTL", 3 * 24 * 3600)),
+            )
+        return _search_cache
+
+
+class CachedSearchTool(BaseTool):
+    """Serper search with results cached by normalized query and concurrent lookups coalesced."""
+
+    name: str = "Search the internet with Serper"
+    description: str = "A tool that can be used to search the internet with a search_query."
+    args_schema: Type[BaseModel] = CachedSearchToolSchema
+    search_tool: Any = Field(default_factory=SerperDevTool)
+    cache: Any = Field(default_factory=search_cache)
+
+    def _run(self, search_query: str, **kwargs: Any) -> Any:
+        with TRACER.span("tool", self.name):
+            return self._search(search_query, **kwargs)
+
+    def _search(self, search_query, **kwargs):
+        key = cache_key(normalize_query(search_query), kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            TRACER.add(cache_hits=1)
+            return cached
+
+        with _in_flight_lock:
+            future = _in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = _in_flight[key] = Future()
+
+        if not leader:
+            TRACER.add(coalesced=1)
+            return future.result()
+
+        try:
+            # A previous leader may have cached the result between our cache
+            # check and taking the lead; that check already counted the miss
+            result = self.cache.get(key, record=False)
+            if result is not None:
+                TRACER.add(cache_hits=1)
+                future.set_result(result)
+                return result
+            result = self.search_tool.run(search_query=search_query, **kwargs)
+            self.cache.set(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(key, None)
@@ -0,0 +1,442 @@
+import datetime
+import json
+import os
+import pickle
+import threading
+from collections.abc import MutableMapping
+
+from .lead_store import connect
+
+DEFAULT_LOG_PATH = "training_data.jsonl"
+# CrewAI's pickles, imported once into the store
+LEGACY_PICKLES = ("training_data.pkl", "al_maha_feedback.pkl")
+
+# Record kinds. Feedback and improved output of an iteration are separate
+# appends, since CrewAI saves the improved output after the human feedback
+FEEDBACK = "feedback"
+IMPROVED = "improved"
+SUGGESTIONS = "suggestions"
+
+FEEDBACK_FIELDS = ("initial_output", "human_feedback")
+
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+
+def dataset_name(file_name):
+    """The dataset a CrewAI training file name maps to: ``training_data.pkl`` -> ``training_data``."""
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+class TrainingStore:
+    """
+    Append-only training data log with a SQLite index, replacing CrewAI's pickles.
+
+    Every piece of feedback, improved output or trained suggestion is one JSON
+    line appended to the log; nothing is ever rewritten. The index maps
+    dataset, run (CrewAI's agent id), company, agent role and iteration to the
+    line's byte offset, so a lookup reads only the lines it needs no matter
+    how much history has piled up.
+    """
+
+    def __init__(self, path=None, index_path=None, legacy_pickles=LEGACY_PICKLES):
+        self.path = path or os.getenv("TRAINING_STORE_PATH", DEFAULT_LOG_PATH)
+        self._lock = threading.RLock()
+        self._conn = connect(index_path or os.path.splitext(self.path)[0] + ".db")
+        # CrewAI agent id -> role, and the company being trained on (see install())
+        self.roles = {}
+        self.company = None
+        self._create_schema()
+        self._index_unindexed_lines()
+        for pickle_path in legacy_pickles or ():
+            self._import_pickle(pickle_path)
+
+    def _create_schema(self):
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS training_records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dataset TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    run TEXT,
+                    company TEXT,
+                    agent TEXT,
+                    iteration INTEGER,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    recorded_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_training_run ON training_records (dataset, run, iteration);
+                CREATE INDEX IF NOT EXISTS idx_training_agent ON training_records (dataset, kind, agent);
+                CREATE INDEX IF NOT EXISTS idx_training_company ON training_records (company, agent, iteration);
+
+                CREATE TABLE IF NOT EXISTS training_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                """
+            )
+
+    def _index_row(self, record, offset, length):
+        self._conn.execute(
+            """INSERT INTO training_records
+                   (dataset, kind, run, company, agent, iteration, offset, length, recorded_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                record["dataset"],
+                record["kind"],
+                record.get("run"),
+                record.get("company"),
+                record.get("agent"),
+                record.get("iteration"),
+                offset,
+                length,
+                record["recorded_at"],
+            ),
+        )
+
+    def _index_unindexed_lines(self):
+        """Index lines appended after the last indexed one (a crash between the two writes)."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(offset + length) FROM training_records").fetchone()
+            end = row[0] or 0
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(end)
+                    offset = end
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # Torn last line: the append never completed
+                            break
+                        self._index_row(record, offset, len(line))
+                        offset += len(line)
+            except FileNotFoundError:
+                pass
+
+    def append(self, dataset, kind, data, run=None, company=None, agent=None, iteration=None):
+        """Append one record to the log and index it."""
+        record = {
+            "dataset": dataset,
+            "kind": kind,
+            "run": run,
+            "company": company,
+            "agent": agent,
+            "iteration": iteration,
+            "data": data,
+            "recorded_at": _now(),
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._index_row(record, offset, len(line))
+        return record
+
+    def _read(self, rows):
+        """Stream the records behind index rows, in row order."""
+        if not rows:
+            return
+        with open(self.path, "rb") as f:
+            for row in rows:
+                f.seek(row["offset"])
+                yield json.loads(f.read(row["length"]))
+
+    def records(self, dataset=None, kind=None, run=None, company=None, agent=None, iteration=None):
+        """Yield matching records oldest first, reading only their lines from the log."""
+        filters = {
+            "dataset": dataset,
+            "kind": kind,
+            "run": run,
+            "company": company,
+            "agent": agent,
+            "iteration": iteration,
+        }
+        filters = {column: value for column, value in filters.items() if value is not None}
+        where = " AND ".join(f"{column} = ?" for column in filters) or "1"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT offset, length FROM training_records WHERE {where} ORDER BY id", tuple(filters.values())
+            ).fetchall()
+        yield from self._read(rows)
+
+    def iterations(self, dataset, run):
+        """One run's training data in CrewAI's shape: {iteration: {initial_output, human_feedback, improved_output}}."""
+        iterations = {}
+        for record in self.records(dataset=dataset, run=run):
+            if record["kind"] in (FEEDBACK, IMPROVED):
+                iterations.setdefault(record["iteration"], {}).update(record["data"])
+        return iterations
+
+    def has_runs(self, dataset):
+        with self._lock:
+            return (
+                self._conn.execute(
+                    "SELECT 1 FROM training_records WHERE dataset = ? AND run IS NOT NULL LIMIT 1", (dataset,)
+                ).fetchone()
+                is not None
+            )
+
+    def runs(self, dataset):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT run FROM training_records WHERE dataset = ? AND run IS NOT NULL", (dataset,)
+            ).fetchall()
+        return [row["run"] for row in rows]
+
+    def save_iterations(self, dataset, run, iterations):
+        """Append whatever in ``iterations`` differs from what is stored for ``run``."""
+        with self._lock:
+            stored = self.iterations(dataset, run)
+            company = self.company
+            agent = self.roles.get(run)
+            for iteration, entry in iterations.items():
+                old = stored.get(iteration, {})
+                feedback = {field: entry[field] for field in FEEDBACK_FIELDS if field in entry}
+                if feedback and any(old.get(field) != value for field, value in feedback.items()):
+                    self.append(dataset, FEEDBACK, feedback, run, company, agent, iteration)
+                if "improved_output" in entry and old.get("improved_output") != entry["improved_output"]:
+                    self.append(
+                        dataset, IMPROVED, {"improved_output": entry["improved_output"]}, run, company, agent, iteration
+                    )
+
+    def suggestions(self, dataset, agent):
+        """The latest trained data saved for an agent role, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT offset, length FROM training_records
+                   WHERE dataset = ? AND kind = ? AND agent = ?
+                   ORDER BY id DESC LIMIT 1""",
+                (dataset, SUGGESTIONS, agent),
+            ).fetchone()
+        return next(self._read([row]))["data"] if row else None
+
+    def has_suggestions(self, dataset):
+        with self._lock:
+            return (
+                self._conn.execute(
+                    "SELECT 1 FROM training_records WHERE dataset = ? AND kind = ? LIMIT 1", (dataset, SUGGESTIONS)
+                ).fetchone()
+                is not None
+            )
+
+    def trained_agents(self, dataset):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT agent FROM training_records WHERE dataset = ? AND kind = ?", (dataset, SUGGESTIONS)
+            ).fetchall()
+        return [row["agent"] for row in rows]
+
+    def save_suggestions(self, dataset, agent, trained_data):
+        self.append(dataset, SUGGESTIONS, trained_data, company=self.company, agent=agent)
+
+    def _import_pickle(self, pickle_path):
+        """One-time import of a CrewAI training pickle into the log."""
+        dataset = dataset_name(pickle_path)
+        key = f"imported:{os.path.abspath(pickle_path)}"
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM training_meta WHERE key = ?", (key,)).fetchone():
+                return
+            try:
+                with open(pickle_path, "rb") as f:
+                    data = pickle.load(f)  # nosec - written by CrewAI on this machine
+            except FileNotFoundError:
+                return
+            except (EOFError, pickle.UnpicklingError):
+                data = {}
+
+            imported = 0
+            for key_or_role, value in (data or {}).items():
+                if not isinstance(value, dict):
+                    continue
+                if "suggestions" in value:
+                    # Trained agents data: {role: {suggestions, quality, final_summary}}
+                    self.append(dataset, SUGGESTIONS, value, agent=key_or_role)
+                    imported += 1
+                    continue
+                # Training data: {agent id: {iteration: {initial_output, human_feedback, improved_output}}}
+                for iteration, entry in value.items():
+                    feedback = {field: entry[field] for field in FEEDBACK_FIELDS if field in entry}
+                    if feedback:
+                        self.append(dataset, FEEDBACK, feedback, run=key_or_role, iteration=iteration)
+                    if "improved_output" in entry:
+                        self.append(
+                            dataset,
+                            IMPROVED,
+                            {"improved_output": entry["improved_output"]},
+                            run=key_or_role,
+                            iteration=iteration,
+                        )
+                    imported += 1
+            self._conn.execute("INSERT INTO training_meta (key, value) VALUES (?, ?)", (key, _now()))
+            if imported:
+                print(f"Imported {imported} training records from {pickle_path} into {self.path}")
+
+
+class _TrainingDataView(MutableMapping):
+    """CrewAI's training data dict ({run: {iteration: entry}}), read and written through the store."""
+
+    def __init__(self, store, dataset):
+        self.store = store
+        self.dataset = dataset
+
+    def __getitem__(self, run):
+        iterations = self.store.iterations(self.dataset, run)
+        if not iterations:
+            raise KeyError(run)
+        return iterations
+
+    def __setitem__(self, run, iterations):
+        self.store.save_iterations(self.dataset, run, iterations)
+
+    def __delitem__(self, run):
+        raise TypeError("training data is append-only")
+
+    def __iter__(self):
+        return iter(self.store.runs(self.dataset))
+
+    def __len__(self):
+        return len(self.store.runs(self.dataset))
+
+    def __bool__(self):
+        return self.store.has_runs(self.dataset)
+
+
+class _TrainedAgentsView(MutableMapping):
+    """CrewAI's trained agents dict ({role: trained data}), read and written through the store."""
+
+    def __init__(self, store, dataset):
+        self.store = store
+        self.dataset = dataset
+
+    def __getitem__(self, role):
+        trained_data = self.store.suggestions(self.dataset, role)
+        if trained_data is None:
+            raise KeyError(role)
+        return trained_data
+
+    def __setitem__(self, role, trained_data):
+        self.store.save_suggestions(self.dataset, role, trained_data)
+
+    def __delitem__(self, role):
+        raise TypeError("training data is append-only")
+
+    def __iter__(self):
+        return iter(self.store.trained_agents(self.dataset))
+
+    def __len__(self):
+        return len(self.store.trained_agents(self.dataset))
+
+    def __bool__(self):
+        return self.store.has_suggestions(self.dataset)
+
+
+class StoreTrainingHandler:
+    """
+    Drop-in for CrewAI's CrewTrainingHandler that keeps a file's data in a TrainingStore.
+
+    ``load()`` returns a lazy view instead of the whole unpickled history, so
+    CrewAI's ``data.get(agent_id)`` lookups hit the index. Saves append only
+    what changed.
+    """
+
+    TRAINING_DATA = "training_data"
+
+    def __init__(self, file_name, store=None):
+        self.file_path = file_name
+        self.dataset = dataset_name(file_name)
+        self._store = store
+
+    @property
+    def store(self):
+        return self._store or training_store()
+
+    def load(self):
+        if self.dataset == self.TRAINING_DATA:
+            return _TrainingDataView(self.store, self.dataset)
+        return _TrainedAgentsView(self.store, self.dataset)
+
+    def save(self, data):
+        view = self.load()
+        if data is view or isinstance(data, (_TrainingDataView, _TrainedAgentsView)):
+            return
+        for key, value in data.items():
+            view[key] = value
+
+    def append(self, train_iteration, agent_id, new_data):
+        self.store.save_iterations(self.dataset, agent_id, {train_iteration: new_data})
+
+    def save_trained_data(self, agent_id, trained_data):
+        self.store.save_suggestions(self.dataset, agent_id, trained_data)
+        # Ordinary runs read trained suggestions through CrewAI's own handler,
+        # so the (small, once per agent) pickle is still written for them
+        trained = {role: self.store.suggestions(self.dataset, role) for role in self.store.trained_agents(self.dataset)}
+        with open(self.file_path, "wb") as f:
+            pickle.dump(trained, f)
+
+    def initialize_file(self):
+        # CrewAI wipes the file at the start of training. History is kept here:
+        # a training session's runs are new agent ids, so old runs never mix in
+        pass
+
+    def clear(self):
+        # Called when training fails; what was recorded stays in the log
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def training_store():
+    """The process-wide store, opened (and the legacy pickles imported) on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TrainingStore()
+        return _store
+
+
+_installed = False
+
+
+def install():
+    """
+    Route CrewAI's training data through the store instead of pickle files.
+
+    Meant for training runs only (main.train() calls it); it patches CrewAI's
+    modules for the rest of the process. Also tags records with the company
+    being trained on and the agent role behind each CrewAI agent id, which
+    CrewAI's own files don't keep, on CrewAI versions with the event bus.
+    """
+    global _installed
+    if _installed:
+        return
+    import crewai.agent
+    import crewai.agents.crew_agent_executor
+    import crewai.crew
+
+    for module in (crewai.agent, crewai.agents.crew_agent_executor, crewai.crew):
+        module.CrewTrainingHandler = StoreTrainingHandler
+    _installed = True
+
+    try:
+        from crewai.utilities.events import AgentExecutionStartedEvent, CrewTrainStartedEvent, crewai_event_bus
+    except ImportError:
+        # Older CrewAI (0.76) has no event bus: records are kept without company and role
+        return
+
+    @crewai_event_bus.on(CrewTrainStartedEvent)
+    def _on_train_started(source, event):
+        training_store().company = (event.inputs or {}).get("company")
+
+    @crewai_event_bus.on(AgentExecutionStartedEvent)
+    def _on_agent_started(source, event):
+        if getattr(event.agent, "crew", None) is not None and event.agent.crew._train:
+            training_store().roles[str(event.agent.id)] = event.agent.role